@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Jim Pivarski
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from array import array
+import json as jsonlib
+
+from histogrammar.defs import *
+from histogrammar.util import *
+from histogrammar.histogram import asHistogram
+from histogrammar.primitives.bin import Bin
+from histogrammar.primitives.categorize import Categorize
+from histogrammar.primitives.collection import Label, UntypedLabel, Index, Branch
+from histogrammar.primitives.count import Count
+from histogrammar.primitives.fraction import Fraction
+from histogrammar.primitives.sparsebin import SparselyBin
+
+class ShapeMismatch(Exception):
+    """Raised by a compiled decoder when a document does not have the shape it was compiled for."""
+    pass
+
+class JsonDecoder(object):
+    """Drop-in replacement for Factory.fromJson that is faster for many documents of the same shape.
+
+    The first document of each container type is used to infer its type tree, and a decoder specialized to that tree
+    is built from closures that read each field directly: it does not look up factories, and a Bin of Counts is read
+    straight into the array of a histogram without making a Count per bin. Later documents with the same shape reuse
+    it; documents of a new shape get a decoder of their own (at most maxShapes per container type).
+
+    With validate=True (the default), any document that the compiled decoder does not accept is passed to
+    Factory.fromJson, so that invalid input raises exactly what it would have raised. With validate=False, field types
+    and key sets are not checked, which is faster but only suitable for trusted input.
+    """
+
+    def __init__(self, validate=True, maxShapes=16):
+        self.validate = validate
+        self.maxShapes = maxShapes
+        self.decoders = {}
+
+    def fromJson(self, json):
+        if isinstance(json, basestring):
+            json = jsonlib.loads(json)
+
+        try:
+            name = json["type"]
+            data = json["data"]
+            if self.validate and (len(json) != 2 or name not in Factory.registered):
+                raise ShapeMismatch()
+        except Exception:
+            return Factory.fromJson(json)
+
+        decoders = self.decoders.setdefault(name, [])
+        for decoder in decoders:
+            try:
+                return decoder(data)
+            except ShapeMismatch:
+                pass
+            except Exception:
+                if self.validate:
+                    return Factory.fromJson(json)
+                raise
+
+        try:
+            decoder = self.compile(name, data)
+            out = decoder(data)
+        except ShapeMismatch:
+            return Factory.fromJson(json)
+        except Exception:
+            if self.validate:
+                return Factory.fromJson(json)
+            raise
+
+        decoders.insert(0, decoder)
+        del decoders[self.maxShapes:]
+        return out
+
+    def number(self, x):
+        if self.validate and not isinstance(x, (int, long, float)):
+            raise ShapeMismatch()
+        return float(x)
+
+    def keys(self, json, keys):
+        if self.validate and (not isinstance(json, dict) or len(json) != len(keys) or any(k not in json for k in keys)):
+            raise ShapeMismatch()
+
+    def child(self, name, sample):
+        """Decoder for a subcontainer of type name, compiled from sample (or from the first fragment it sees)."""
+        if name not in Factory.registered:
+            raise ShapeMismatch()
+        if sample is not None:
+            return self.compile(name, sample)
+
+        compiled = []
+        def decode(json):
+            if len(compiled) == 0:
+                compiled.append(self.compile(name, json))
+            return compiled[0](json)
+        return decode
+
+    def compile(self, name, sample):
+        """Build a decoder for fragments of container type name that have the same type tree as sample."""
+
+        if name == "Count":
+            def decode(json):
+                out = Count.__new__(Count)
+                out.entries = self.number(json)
+                if out.entries < 0.0:
+                    raise ShapeMismatch()
+                return out
+
+            return decode
+
+        elif name in ("Sum", "Average", "Deviate", "Minimize", "Maximize"):
+            # the same objects as Factory.registered[name].ed(...), built without going through __init__
+            factory = Factory.registered[name]
+            field = {"Sum": "sum", "Average": "mean", "Deviate": "mean", "Minimize": "min", "Maximize": "max"}[name]
+            keys = ["entries", field] + (["variance"] if name == "Deviate" else [])
+            extremum = name in ("Minimize", "Maximize")
+
+            def decode(json):
+                self.keys(json, keys)
+                entries = self.number(json["entries"])
+                if entries < 0.0:
+                    raise ShapeMismatch()
+                out = factory.__new__(factory)
+                out.quantity = None
+                out.selection = None
+                out.entries = entries
+                if extremum and json[field] in ("nan", "inf", "-inf"):
+                    setattr(out, field, float(json[field]))
+                else:
+                    setattr(out, field, self.number(json[field]))
+                if name == "Deviate":
+                    out.varianceTimesEntries = self.number(json["variance"]) * entries
+                return out
+
+            return decode
+
+        elif name == "Bin":
+            keys = ["low", "high", "entries", "values:type", "values", "underflow:type", "underflow", "overflow:type", "overflow", "nanflow:type", "nanflow"]
+            self.keys(sample, keys)
+            types = [sample[k + ":type"] for k in ("values", "underflow", "overflow", "nanflow")]
+            value = self.child(types[0], sample["values"][0] if len(sample["values"]) > 0 else None)
+            underflow = self.child(types[1], sample["underflow"])
+            overflow = self.child(types[2], sample["overflow"])
+            nanflow = self.child(types[3], sample["nanflow"])
+            histogram = all(x == "Count" for x in types)
+
+            def decode(json):
+                self.keys(json, keys)
+                if json["values:type"] != types[0] or json["underflow:type"] != types[1] or json["overflow:type"] != types[2] or json["nanflow:type"] != types[3]:
+                    raise ShapeMismatch()
+                low = self.number(json["low"])
+                high = self.number(json["high"])
+                entries = self.number(json["entries"])
+                if self.validate and not isinstance(json["values"], list):
+                    raise ShapeMismatch()
+
+                if entries < 0.0 or low >= high or len(json["values"]) == 0:
+                    raise ShapeMismatch()
+
+                # the same object as Bin.ed(...), built without going through __init__
+                out = Bin.__new__(Bin)
+                out.entries = entries
+                out.low = low
+                out.high = high
+                out.quantity = None
+                out.selection = None
+                out.underflow = underflow(json["underflow"])
+                out.overflow = overflow(json["overflow"])
+                out.nanflow = nanflow(json["nanflow"])
+                if not histogram:
+                    out.values = [value(x) for x in json["values"]]
+                    return out.specialize()
+
+                contents = array("d", json["values"])
+                if self.validate and min(contents) < 0.0:
+                    raise ShapeMismatch()
+                return asHistogram(out, contents)
+
+            return decode
+
+        elif name == "SparselyBin":
+            keys = ["binWidth", "entries", "bins:type", "bins", "nanflow:type", "nanflow", "origin"]
+            self.keys(sample, keys)
+            types = sample["bins:type"], sample["nanflow:type"]
+            value = self.child(types[0], next(iter(sample["bins"].values()), None))
+            nanflow = self.child(types[1], sample["nanflow"])
+
+            def decode(json):
+                self.keys(json, keys)
+                if json["bins:type"] != types[0] or json["nanflow:type"] != types[1]:
+                    raise ShapeMismatch()
+                if self.validate and not (isinstance(json["bins"], dict) and isinstance(json["origin"], (int, long, float))):
+                    raise ShapeMismatch()
+                bins = {int(i): value(v) for i, v in json["bins"].items()}
+                return SparselyBin.ed(self.number(json["binWidth"]), self.number(json["entries"]), types[0], bins, nanflow(json["nanflow"]), json["origin"])
+
+            return decode
+
+        elif name == "Categorize" or name == "Label" or name == "Index":
+            keys = ["entries", "type", "data"]
+            self.keys(sample, keys)
+            contentType = sample["type"]
+            values = sample["data"].values() if isinstance(sample["data"], dict) else sample["data"]
+            value = self.child(contentType, values[0] if len(values) > 0 else None)
+            container = Categorize if name == "Categorize" else Label if name == "Label" else Index
+
+            def decode(json):
+                self.keys(json, keys)
+                if json["type"] != contentType:
+                    raise ShapeMismatch()
+                entries = self.number(json["entries"])
+                if container is Index:
+                    if self.validate and not isinstance(json["data"], list):
+                        raise ShapeMismatch()
+                    return Index.ed(entries, *[value(x) for x in json["data"]])
+                if self.validate and not isinstance(json["data"], dict):
+                    raise ShapeMismatch()
+                pairs = {k: value(v) for k, v in json["data"].items()}
+                if container is Categorize:
+                    return Categorize.ed(entries, contentType, **pairs)
+                else:
+                    return Label.ed(entries, **pairs)
+
+            return decode
+
+        elif name == "UntypedLabel":
+            keys = ["entries", "data"]
+            self.keys(sample, keys)
+            values = {k: (v["type"], self.child(v["type"], v["data"])) for k, v in sample["data"].items()}
+
+            def decode(json):
+                self.keys(json, keys)
+                data = json["data"]
+                if len(data) != len(values):
+                    raise ShapeMismatch()
+                pairs = {}
+                for k, v in data.items():
+                    self.keys(v, ["type", "data"])
+                    if k not in values or v["type"] != values[k][0]:
+                        raise ShapeMismatch()
+                    pairs[k] = values[k][1](v["data"])
+                return UntypedLabel.ed(self.number(json["entries"]), **pairs)
+
+            return decode
+
+        elif name == "Branch":
+            keys = ["entries", "data"]
+            self.keys(sample, keys)
+            values = [(k, self.child(k, v)) for x in sample["data"] for k, v in x.items()]
+
+            def decode(json):
+                self.keys(json, keys)
+                data = json["data"]
+                if len(data) != len(values):
+                    raise ShapeMismatch()
+                out = []
+                for x, (k, value) in zip(data, values):
+                    if self.validate and not (isinstance(x, dict) and len(x) == 1):
+                        raise ShapeMismatch()
+                    if k not in x:
+                        raise ShapeMismatch()
+                    out.append(value(x[k]))
+                return Branch.ed(self.number(json["entries"]), *out)
+
+            return decode
+
+        elif name == "Fraction":
+            keys = ["entries", "type", "numerator", "denominator"]
+            self.keys(sample, keys)
+            contentType = sample["type"]
+            numerator = self.child(contentType, sample["numerator"])
+            denominator = self.child(contentType, sample["denominator"])
+
+            def decode(json):
+                self.keys(json, keys)
+                if json["type"] != contentType:
+                    raise ShapeMismatch()
+                return Fraction.ed(self.number(json["entries"]), numerator(json["numerator"]), denominator(json["denominator"]))
+
+            return decode
+
+        else:
+            return Factory.registered[name].fromJsonFragment
@@ -14,7 +14,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
 import json as jsonlib
+import threading
 
 from histogrammar.util import *
 
@@ -39,14 +41,23 @@ class Factory(object):
         Factory.registered[factory.__name__] = factory
 
     def __init__(self):
+        self.specialize()
+
+    def specialize(self):
         try:
             import histogrammar.histogram
             histogrammar.histogram.addImplicitMethods(self)
         except (ImportError, AttributeError):
             pass
+        return self
 
     @staticmethod
-    def fromJson(json):
+    def fromJson(json, lazy=False):
+        """Load a container from JSON (a string or parsed objects).
+
+        With lazy=True, the contents of Labels, UntypedLabels, Indexes, Branches, and Categorizes are not decoded until
+        they are first used (so errors in them are only raised then).
+        """
         if isinstance(json, basestring):
             json = jsonlib.loads(json)
 
@@ -59,11 +70,16 @@ class Factory(object):
             if name not in Factory.registered:
                 raise JsonFormatException(json, "unrecognized container (is it a custom container that hasn't been registered?): {}".format(name))
 
-            return Factory.registered[name].fromJsonFragment(json["data"])
+            with lazyLoading.loading(lazy):
+                return Factory.registered[name].fromJsonFragment(json["data"])
 
         else:
             raise JsonFormatException(json, "Factory")
-        
+
+    @staticmethod
+    def fromBytes(data):
+        return Factory.fromJson(decodeBytes(data))
+
 class Container(object):
     @property
     def name(self): return self.__class__.__name__
@@ -74,14 +90,98 @@ class Container(object):
     def __add__(self, other): raise NotImplementedError
     def fill(self, datum, weight=1.0): raise NotImplementedError
 
+    def fillBatch(self, data, weights=None):
+        if weights is None:
+            for datum in data:
+                self.fill(datum)
+        elif isinstance(weights, (int, long, float)):
+            for datum in data:
+                self.fill(datum, weights)
+        else:
+            for datum, weight in zip(data, weights):
+                self.fill(datum, weight)
+
+    def fillArray(self, values, weights=None): return self.fillBatch(values, weights)
+
     def copy(self): return self + self.zero()
 
     def toJson(self): return {"type": self.name, "data": self.toJsonFragment()}
     def toJsonFragment(self): raise NotImplementedError
+    def toBytes(self): return encodeBytes(self.toJson())
+    def toJsonStream(self, fileobj): writeJson(fileobj, {"type": self.name, "data": self})
+    def toJsonStreamFragment(self, fileobj): writeJson(fileobj, self.toJsonFragment())
     def __repr__(self): raise NotImplementedError
 
 unweighted = Fcn(lambda datum: 1.0)
 
+################################################################ lazy loading (Factory.fromJson(..., lazy=True))
+
+class LazyLoading(threading.local):
+    """Whether subcontainers are currently being loaded lazily; each thread has its own setting."""
+
+    def __init__(self):
+        self.enabled = False
+
+    @contextlib.contextmanager
+    def loading(self, enabled):
+        previous = self.enabled
+        self.enabled = enabled
+        try:
+            yield
+        finally:
+            self.enabled = previous
+
+lazyLoading = LazyLoading()
+
+class LazyContainer(object):
+    """Base of the placeholders made by lazyFragment: a subclass of the container's own class that holds its JSON fragment.
+
+    Its name, factory, and type are available without decoding; the first use of anything else decodes the fragment
+    (lazily again, for its own subcontainers) and turns the placeholder, in place, into the decoded container.
+    """
+
+    classes = {}
+
+    def __getattribute__(self, attr):
+        if attr not in ("__class__", "__dict__", "name", "factory", "_decode"):
+            if "_lazyFragment" in object.__getattribute__(self, "__dict__"):
+                object.__getattribute__(self, "_decode")()
+        return object.__getattribute__(self, attr)
+
+    @property
+    def name(self): return type(self).lazyFactory.__name__
+    @property
+    def factory(self): return type(self).lazyFactory
+
+    def _decode(self):
+        fields = object.__getattribute__(self, "__dict__")
+        with lazyLoading.loading(True):
+            out = type(self).lazyFactory.fromJsonFragment(fields["_lazyFragment"])
+        del fields["_lazyFragment"]
+        fields.update(out.__dict__)
+        object.__setattr__(self, "__class__", out.__class__)
+
+def lazyFragment(factory, json):
+    """factory.fromJsonFragment(json), or a placeholder that calls it on first use if lazy loading is enabled."""
+    if not lazyLoading.enabled:
+        return factory.fromJsonFragment(json)
+    if factory not in LazyContainer.classes:
+        LazyContainer.classes[factory] = type("Lazy" + factory.__name__, (LazyContainer, factory), {"lazyFactory": factory})
+    cls = LazyContainer.classes[factory]
+    out = cls.__new__(cls)
+    out.__dict__["_lazyFragment"] = json
+    return out
+
+def selectBatch(selection, data, weights):
+    import numpy
+    w = arrayWeights(weights, len(data))
+    if selection is not unweighted:
+        w = w * arrayEvaluate(selection, data)
+    indexes = numpy.nonzero(w > 0.0)[0]
+    if len(indexes) == len(data):
+        return data, w   # keep the same batch object, so that per-pass cached results still apply
+    return arrayTake(data, indexes), w[indexes]
+
 def increment(container, datum):
     container.fill(datum)
     return container
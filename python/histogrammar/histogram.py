@@ -14,10 +14,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from histogrammar.defs import unweighted
-from histogrammar.util import serializable
+import math
+from array import array
+
+from histogrammar.defs import unweighted, ContainerException
+from histogrammar.util import serializable, exact, arrayEvaluate, arrayTake
+from histogrammar.primitives.average import Average
 from histogrammar.primitives.bin import Bin
 from histogrammar.primitives.count import Count
+from histogrammar.primitives.deviate import Deviate
 
 def Histogram(num, low, high, quantity, selection=unweighted):
     return Bin(num, low, high, quantity, selection, Count(), Count(), Count(), Count())
@@ -25,6 +30,76 @@ def Histogram(num, low, high, quantity, selection=unweighted):
 Histogram.ed = serializable(lambda low, high, entries, values, underflow, overflow, nanflow:
     Bin(len(values), low, high, None, None, None, underflow, overflow, nanflow))
 
+class CountView(Count):
+    """One bin of a HistogramMethods' contiguous storage, presented as a Count."""
+
+    def __init__(self, contents, index):
+        self.contents = contents
+        self.index = index
+
+    @property
+    def name(self):
+        return "Count"
+
+    @property
+    def factory(self):
+        return Count
+
+    @property
+    def entries(self):
+        return self.contents[self.index]
+
+    @entries.setter
+    def entries(self, value):
+        self.contents[self.index] = value
+
+class CountArray(object):
+    """Read-write sequence of CountViews over an array of bin contents."""
+
+    def __init__(self, contents):
+        self.contents = contents
+
+    def __len__(self):
+        return len(self.contents)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [CountView(self.contents, i) for i in xrange(*index.indices(len(self.contents)))]
+        index = int(index)
+        if index < 0:
+            index += len(self.contents)
+        if not 0 <= index < len(self.contents):
+            raise IndexError("bin index out of range")
+        return CountView(self.contents, index)
+
+    def __setitem__(self, index, value):
+        self[index].entries = value.entries
+
+    def __iter__(self):
+        for i in xrange(len(self.contents)):
+            yield CountView(self.contents, i)
+
+    def __eq__(self, other):
+        if isinstance(other, CountArray):
+            return len(self.contents) == len(other.contents) and all(exact(x, y) for x, y in zip(self.contents, other.contents))
+        try:
+            return len(self) == len(other) and all(x == y for x, y in zip(self, other))
+        except TypeError:
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "[" + ", ".join(repr(x) for x in self) + "]"
+
+def asHistogram(container, contents):
+    """Turn a Bin into a HistogramMethods whose bin contents are stored in an array of doubles."""
+    container.__dict__.pop("values", None)
+    container.__class__ = HistogramMethods
+    container.contents = contents
+    return container
+
 class HistogramMethods(Bin):
     @property
     def name(self):
@@ -34,9 +109,83 @@ class HistogramMethods(Bin):
     def factory(self):
         return Bin
 
+    @property
+    def values(self):
+        return CountArray(self.contents)
+
+    @values.setter
+    def values(self, values):
+        self.contents = array("d", [v.entries for v in values])
+
+    @property
+    def num(self):
+        return len(self.contents)
+
+    def zero(self):
+        return asHistogram(Bin(self.num, self.low, self.high, self.quantity, self.selection, None, self.underflow.zero(), self.overflow.zero(), self.nanflow.zero()), array("d", [0.0]) * self.num)
+
+    def __add__(self, other):
+        if isinstance(other, HistogramMethods):
+            if self.low != other.low:
+                raise ContainerException("cannot add Bins because low differs ({} vs {})".format(self.low, other.low))
+            if self.high != other.high:
+                raise ContainerException("cannot add Bins because high differs ({} vs {})".format(self.high, other.high))
+            if self.num != other.num:
+                raise ContainerException("cannot add Bins because nubmer of values differs ({} vs {})".format(self.num, other.num))
+
+            out = asHistogram(Bin(self.num, self.low, self.high, self.quantity, self.selection, None, self.underflow + other.underflow, self.overflow + other.overflow, self.nanflow + other.nanflow), array("d", [x + y for x, y in zip(self.contents, other.contents)]))
+            out.entries = self.entries + other.entries
+            return out
+        else:
+            return super(HistogramMethods, self).__add__(other)
+
+    def __iadd__(self, other):
+        if isinstance(other, HistogramMethods):
+            if self.low != other.low:
+                raise ContainerException("cannot add Bins because low differs ({} vs {})".format(self.low, other.low))
+            if self.high != other.high:
+                raise ContainerException("cannot add Bins because high differs ({} vs {})".format(self.high, other.high))
+            if self.num != other.num:
+                raise ContainerException("cannot add Bins because nubmer of values differs ({} vs {})".format(self.num, other.num))
+
+            contents = self.contents
+            for i, x in enumerate(other.contents):
+                contents[i] += x
+            self.entries += other.entries
+            self.underflow += other.underflow
+            self.overflow += other.overflow
+            self.nanflow += other.nanflow
+            return self
+        else:
+            return super(HistogramMethods, self).__iadd__(other)
+
+    def fill(self, datum, weight=1.0):
+        if self.quantity is None or self.selection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        w = weight * self.selection(datum)
+
+        if w > 0.0:
+            q = self.quantity(datum)
+
+            self.entries += w
+            if math.isnan(q):
+                self.nanflow.fill(datum, w)
+            elif q < self.low:
+                self.underflow.fill(datum, w)
+            elif q >= self.high:
+                self.overflow.fill(datum, w)
+            else:
+                self.contents[int(math.floor(len(self.contents) * (q - self.low) / (self.high - self.low)))] += w
+
+    def _addCountsBatch(self, counts):
+        import numpy
+        contents = numpy.frombuffer(self.contents, dtype=numpy.float64)
+        contents += counts
+
     @property
     def numericalValues(self):
-        return [v.entries for v in self.values]
+        return list(self.contents)
 
     @property
     def numericalOverflow(self):
@@ -87,10 +236,301 @@ class HistogramMethods(Bin):
         self.__setTH1(th1)
         return th1
 
+class AverageView(Average):
+    """One bin of a ProfileMethods' parallel arrays, presented as an Average."""
+
+    def __init__(self, profile, index):
+        self.profile = profile
+        self.index = index
+
+    @property
+    def name(self):
+        return "Average"
+
+    @property
+    def factory(self):
+        return Average
+
+    @property
+    def quantity(self):
+        return self.profile.valueQuantity
+
+    @property
+    def selection(self):
+        return self.profile.valueSelection
+
+    @property
+    def entries(self):
+        return self.profile.valuesEntries[self.index]
+
+    @entries.setter
+    def entries(self, value):
+        self.profile.valuesEntries[self.index] = value
+
+    @property
+    def mean(self):
+        return self.profile.valuesMean[self.index]
+
+    @mean.setter
+    def mean(self, value):
+        self.profile.valuesMean[self.index] = value
+
+class DeviateView(Deviate):
+    """One bin of a ProfileMethods' parallel arrays, presented as a Deviate."""
+
+    def __init__(self, profile, index):
+        self.profile = profile
+        self.index = index
+
+    @property
+    def name(self):
+        return "Deviate"
+
+    @property
+    def factory(self):
+        return Deviate
+
+    @property
+    def quantity(self):
+        return self.profile.valueQuantity
+
+    @property
+    def selection(self):
+        return self.profile.valueSelection
+
+    @property
+    def entries(self):
+        return self.profile.valuesEntries[self.index]
+
+    @entries.setter
+    def entries(self, value):
+        self.profile.valuesEntries[self.index] = value
+
+    @property
+    def mean(self):
+        return self.profile.valuesMean[self.index]
+
+    @mean.setter
+    def mean(self, value):
+        self.profile.valuesMean[self.index] = value
+
+    @property
+    def varianceTimesEntries(self):
+        return self.profile.valuesVarianceTimesEntries[self.index]
+
+    @varianceTimesEntries.setter
+    def varianceTimesEntries(self, value):
+        self.profile.valuesVarianceTimesEntries[self.index] = value
+
+class MomentsArray(object):
+    """Read-write sequence of AverageViews or DeviateViews over a ProfileMethods' parallel arrays."""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.view = DeviateView if profile.valuesVarianceTimesEntries is not None else AverageView
+
+    def __len__(self):
+        return len(self.profile.valuesEntries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.view(self.profile, i) for i in xrange(*index.indices(len(self)))]
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("bin index out of range")
+        return self.view(self.profile, index)
+
+    def __setitem__(self, index, value):
+        view = self[index]
+        view.entries = value.entries
+        view.mean = value.mean
+        if isinstance(view, Deviate):
+            view.varianceTimesEntries = value.varianceTimesEntries
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self.view(self.profile, i)
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and all(x == y for x, y in zip(self, other))
+        except TypeError:
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "[" + ", ".join(repr(x) for x in self) + "]"
+
+def asProfile(container, quantity, selection, entries, mean, varianceTimesEntries):
+    """Turn a Bin into a ProfileMethods whose Average or Deviate bins are stored as parallel arrays of doubles.
+
+    Pass None for varianceTimesEntries to store Averages rather than Deviates.
+    """
+    container.__dict__.pop("values", None)
+    container.__class__ = ProfileMethods
+    container.valueQuantity = quantity
+    container.valueSelection = selection
+    container.valuesEntries = entries
+    container.valuesMean = mean
+    container.valuesVarianceTimesEntries = varianceTimesEntries
+    return container
+
+class ProfileMethods(Bin):
+    @property
+    def name(self):
+        return "Bin"
+
+    @property
+    def factory(self):
+        return Bin
+
+    @property
+    def values(self):
+        return MomentsArray(self)
+
+    @values.setter
+    def values(self, values):
+        self.valueQuantity = values[0].quantity
+        self.valueSelection = values[0].selection
+        self.valuesEntries = array("d", [v.entries for v in values])
+        self.valuesMean = array("d", [v.mean for v in values])
+        if isinstance(values[0], Deviate):
+            self.valuesVarianceTimesEntries = array("d", [v.varianceTimesEntries for v in values])
+        else:
+            self.valuesVarianceTimesEntries = None
+
+    @property
+    def num(self):
+        return len(self.valuesEntries)
+
+    def zero(self):
+        empty = array("d", [0.0]) * self.num
+        return asProfile(Bin(self.num, self.low, self.high, self.quantity, self.selection, None, self.underflow.zero(), self.overflow.zero(), self.nanflow.zero()),
+                         self.valueQuantity, self.valueSelection, array("d", empty), array("d", empty), None if self.valuesVarianceTimesEntries is None else array("d", empty))
+
+    def _checkAdd(self, other):
+        if self.low != other.low:
+            raise ContainerException("cannot add Bins because low differs ({} vs {})".format(self.low, other.low))
+        if self.high != other.high:
+            raise ContainerException("cannot add Bins because high differs ({} vs {})".format(self.high, other.high))
+        if self.num != other.num:
+            raise ContainerException("cannot add Bins because nubmer of values differs ({} vs {})".format(self.num, other.num))
+
+    def _mergedMoments(self, other):
+        # same formulas as Average.__add__ and Deviate.__add__, applied across the arrays (empty bins stay empty)
+        entries = array("d", [ea + eb for ea, eb in zip(self.valuesEntries, other.valuesEntries)])
+        mean = array("d", [(ea*ma + eb*mb)/e if e != 0.0 else 0.0 for ea, ma, eb, mb, e in zip(self.valuesEntries, self.valuesMean, other.valuesEntries, other.valuesMean, entries)])
+        if self.valuesVarianceTimesEntries is None:
+            varianceTimesEntries = None
+        else:
+            varianceTimesEntries = array("d", [va + vb + ea*ma**2 + eb*mb**2 - 2.0*m*(ea*ma + eb*mb) + m*m*e for va, ea, ma, vb, eb, mb, e, m in zip(self.valuesVarianceTimesEntries, self.valuesEntries, self.valuesMean, other.valuesVarianceTimesEntries, other.valuesEntries, other.valuesMean, entries, mean)])
+        return entries, mean, varianceTimesEntries
+
+    def __add__(self, other):
+        if isinstance(other, ProfileMethods) and (self.valuesVarianceTimesEntries is None) == (other.valuesVarianceTimesEntries is None):
+            self._checkAdd(other)
+            entries, mean, varianceTimesEntries = self._mergedMoments(other)
+            out = asProfile(Bin(self.num, self.low, self.high, self.quantity, self.selection, None, self.underflow + other.underflow, self.overflow + other.overflow, self.nanflow + other.nanflow),
+                            self.valueQuantity, self.valueSelection, entries, mean, varianceTimesEntries)
+            out.entries = self.entries + other.entries
+            return out
+        else:
+            return super(ProfileMethods, self).__add__(other)
+
+    def __iadd__(self, other):
+        if isinstance(other, ProfileMethods) and (self.valuesVarianceTimesEntries is None) == (other.valuesVarianceTimesEntries is None):
+            self._checkAdd(other)
+            self.valuesEntries, self.valuesMean, self.valuesVarianceTimesEntries = self._mergedMoments(other)
+            self.entries += other.entries
+            self.underflow += other.underflow
+            self.overflow += other.overflow
+            self.nanflow += other.nanflow
+            return self
+        else:
+            return super(ProfileMethods, self).__iadd__(other)
+
+    def fill(self, datum, weight=1.0):
+        if self.quantity is None or self.selection is None or self.valueQuantity is None or self.valueSelection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        w = weight * self.selection(datum)
+
+        if w > 0.0:
+            q = self.quantity(datum)
+
+            self.entries += w
+            if math.isnan(q):
+                self.nanflow.fill(datum, w)
+            elif q < self.low:
+                self.underflow.fill(datum, w)
+            elif q >= self.high:
+                self.overflow.fill(datum, w)
+            else:
+                i = int(math.floor(len(self.valuesEntries) * (q - self.low) / (self.high - self.low)))
+                w = w * self.valueSelection(datum)
+                if w > 0.0:
+                    x = self.valueQuantity(datum)
+                    self.valuesEntries[i] += w
+                    delta = x - self.valuesMean[i]
+                    self.valuesMean[i] += delta * w / self.valuesEntries[i]
+                    if self.valuesVarianceTimesEntries is not None:
+                        self.valuesVarianceTimesEntries[i] += w * delta * (x - self.valuesMean[i])
+
+    def _fillBinsBatch(self, index, positions, data, weights):
+        import numpy
+
+        if self.valueQuantity is None or self.valueSelection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        data, w = arrayTake(data, positions), weights[positions]
+        if self.valueSelection is not unweighted:
+            w = w * arrayEvaluate(self.valueSelection, data)
+        selected = numpy.nonzero(w > 0.0)[0]
+        if len(selected) == 0:
+            return
+        data, w, index = arrayTake(data, selected), w[selected], index[selected]
+        q = arrayEvaluate(self.valueQuantity, data).astype(numpy.float64)
+
+        # per-bin moments of this batch, merged into the running moments with Chan et al.'s pairwise update
+        num = len(self.valuesEntries)
+        entries = numpy.bincount(index, weights=w, minlength=num)
+        filled = entries > 0.0
+        mean = numpy.zeros(num)
+        mean[filled] = numpy.bincount(index, weights=w * q, minlength=num)[filled] / entries[filled]
+
+        oldEntries = numpy.frombuffer(self.valuesEntries, dtype=numpy.float64)
+        oldMean = numpy.frombuffer(self.valuesMean, dtype=numpy.float64)
+        newEntries = oldEntries + entries
+        delta = numpy.where(filled, mean - oldMean, 0.0)
+        shift = numpy.zeros(num)
+        shift[filled] = delta[filled] * entries[filled] / newEntries[filled]
+
+        if self.valuesVarianceTimesEntries is not None:
+            oldVarianceTimesEntries = numpy.frombuffer(self.valuesVarianceTimesEntries, dtype=numpy.float64)
+            oldVarianceTimesEntries += numpy.bincount(index, weights=w * (q - mean[index])**2, minlength=num)
+            oldVarianceTimesEntries += delta * shift * oldEntries
+
+        oldMean += shift
+        oldEntries[:] = newEntries
+
 def addImplicitMethods(container):
-    if isinstance(container, Bin) and \
-       all(isinstance(v, Count) for v in container.values) and \
-       isinstance(container.underflow, Count) and \
-       isinstance(container.overflow, Count) and \
-       isinstance(container.nanflow, Count):
-        container.__class__ = HistogramMethods
+    if not isinstance(container, Bin) or isinstance(container, (HistogramMethods, ProfileMethods)):
+        pass
+
+    elif all(isinstance(v, Count) for v in container.values) and \
+         isinstance(container.underflow, Count) and \
+         isinstance(container.overflow, Count) and \
+         isinstance(container.nanflow, Count):
+        asHistogram(container, array("d", [v.entries for v in container.values]))
+
+    elif all(isinstance(v, (Average, Deviate)) for v in container.values):
+        first = container.values[0]
+        if all(v.factory is first.factory and v.quantity is first.quantity and v.selection is first.selection for v in container.values):
+            values = container.values
+            container.__dict__.pop("values", None)
+            container.__class__ = ProfileMethods
+            container.values = values
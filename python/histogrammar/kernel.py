@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Jim Pivarski
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+
+from histogrammar.defs import *
+from histogrammar.util import *
+from histogrammar.histogram import HistogramMethods
+from histogrammar.primitives.average import Average
+from histogrammar.primitives.bin import Bin
+from histogrammar.primitives.categorize import Categorize
+from histogrammar.primitives.collection import Label, UntypedLabel, Index, Branch
+from histogrammar.primitives.count import Count
+from histogrammar.primitives.deviate import Deviate
+from histogrammar.primitives.fraction import Fraction
+from histogrammar.primitives.minmax import Minimize, Maximize
+from histogrammar.primitives.partition import Partition
+from histogrammar.primitives.sparsebin import SparselyBin
+from histogrammar.primitives.stack import Stack
+from histogrammar.primitives.sum import Sum
+
+class _Missing(object):
+    def __repr__(self): return "_missing"
+
+class KernelGenerator(object):
+    """Writes the source of one function that fills a whole container tree, node by node, without method dispatch.
+
+    Nodes that exist when the kernel is compiled are bound into the function's namespace as constants; nodes that are
+    only chosen while filling (a bin of a Bin, a key of a Categorize) are reached through local variables, and their
+    structure is taken from the template they were (or will be) zeroed from. Every quantity or selection function that
+    appears more than once in the tree is evaluated at most once per datum. Containers without a generator here are
+    filled by calling their own fill method.
+    """
+
+    def __init__(self, shared=()):
+        self.shared = shared
+        self.uses = {}
+        self.namespace = {"_missing": _Missing(), "_isnan": math.isnan, "_floor": math.floor}
+        self.constants = {}
+        self.memos = []
+        self.lines = []
+        self.counter = 0
+
+    def fresh(self, prefix):
+        self.counter += 1
+        return "{}{}".format(prefix, self.counter)
+
+    def constant(self, obj, prefix="c"):
+        if id(obj) not in self.constants:
+            name = self.fresh(prefix)
+            self.namespace[name] = obj
+            self.constants[id(obj)] = name
+        return self.constants[id(obj)]
+
+    def emit(self, indent, line):
+        self.lines.append("    " * indent + line)
+
+    def call(self, fcn, indent, target):
+        # assign fcn(datum) to target, reusing a previous evaluation on the same datum if fcn is shared
+        if fcn is None:
+            raise ContainerException("attempting to compile a container that has no fill rule")
+        fcn = fcn.fcn if type(fcn) is Fcn else fcn
+        self.uses[id(fcn)] = self.uses.get(id(fcn), 0) + 1
+        function = self.constant(fcn, "f")
+        if id(fcn) in self.shared:
+            memo = "m" + function
+            if memo not in self.memos:
+                self.memos.append(memo)
+            self.emit(indent, "if {} is _missing:".format(memo))
+            self.emit(indent + 1, "{} = {}(datum)".format(memo, function))
+            self.emit(indent, "{} = {}".format(target, memo))
+        else:
+            self.emit(indent, "{} = {}(datum)".format(target, function))
+
+    def child(self, node, static, indent, expression):
+        # name for a subcontainer: a constant if its object is known now, otherwise a local variable set from expression
+        if static:
+            return self.constant(node, "n")
+        name = self.fresh("n")
+        self.emit(indent, "{} = {}".format(name, expression))
+        return name
+
+    def selected(self, container, ref, weight, indent):
+        # the common prologue of containers with a quantity and selection; returns the new weight and quantity names
+        if container.quantity is None or container.selection is None:
+            raise ContainerException("attempting to compile a container that has no fill rule")
+        w = self.fresh("w")
+        q = self.fresh("q")
+        if container.selection is unweighted:
+            self.emit(indent, "{} = {} * 1.0".format(w, weight))
+        else:
+            s = self.fresh("s")
+            self.call(container.selection, indent, s)
+            self.emit(indent, "{} = {} * {}".format(w, weight, s))
+        self.emit(indent, "if {} > 0.0:".format(w))
+        self.call(container.quantity, indent + 1, q)
+        self.emit(indent + 1, "{}.entries += {}".format(ref, w))
+        return w, q
+
+    def fill(self, container, ref, static, weight, positive, indent):
+        """Emit code that fills container (held in variable ref) with datum and weight.
+
+        If static, ref is bound to exactly this container object; otherwise container is only a template for it.
+        If positive, the weight is already known to be greater than zero.
+        """
+
+        kind = type(container)
+
+        if kind is Count:
+            if not positive:
+                self.emit(indent, "if {} > 0.0:".format(weight))
+                indent += 1
+            self.emit(indent, "{}.entries += {}".format(ref, weight))
+
+        elif kind is Sum:
+            w, q = self.selected(container, ref, weight, indent)
+            self.emit(indent + 1, "{}.sum += {} * {}".format(ref, q, w))
+
+        elif kind is Average or kind is Deviate:
+            w, q = self.selected(container, ref, weight, indent)
+            d = self.fresh("d")
+            self.emit(indent + 1, "{} = {} - {}.mean".format(d, q, ref))
+            self.emit(indent + 1, "{}.mean += {} * {} / {}.entries".format(ref, d, w, ref))
+            if kind is Deviate:
+                self.emit(indent + 1, "{}.varianceTimesEntries += {} * {} * ({} - {}.mean)".format(ref, w, d, q, ref))
+
+        elif kind is Minimize or kind is Maximize:
+            w, q = self.selected(container, ref, weight, indent)
+            attr = "min" if kind is Minimize else "max"
+            x = self.fresh("x")
+            self.emit(indent + 1, "{} = {}.{}".format(x, ref, attr))
+            self.emit(indent + 1, "if _isnan({}) or {} {} {}:".format(x, q, "<" if kind is Minimize else ">", x))
+            self.emit(indent + 2, "{}.{} = {}".format(ref, attr, q))
+
+        elif kind is Bin or kind is HistogramMethods:
+            w, q = self.selected(container, ref, weight, indent)
+            self.emit(indent + 1, "if _isnan({}):".format(q))
+            self.fill(container.nanflow, self.child(container.nanflow, static, indent + 2, ref + ".nanflow"), static, w, True, indent + 2)
+            self.emit(indent + 1, "elif {} < {}:".format(q, self.constant(container.low, "k")))
+            self.fill(container.underflow, self.child(container.underflow, static, indent + 2, ref + ".underflow"), static, w, True, indent + 2)
+            self.emit(indent + 1, "elif {} >= {}:".format(q, self.constant(container.high, "k")))
+            self.fill(container.overflow, self.child(container.overflow, static, indent + 2, ref + ".overflow"), static, w, True, indent + 2)
+            self.emit(indent + 1, "else:")
+            index = "int(_floor({} * ({} - {}) / ({} - {})))".format(self.constant(container.num, "k"), q, self.constant(container.low, "k"), self.constant(container.high, "k"), self.constant(container.low, "k"))
+            if kind is HistogramMethods:
+                self.emit(indent + 2, "{}.contents[{}] += {}".format(ref, index, w))
+            else:
+                values = self.constant(container.values, "v") if static else ref + ".values"
+                sub = self.fresh("n")
+                self.emit(indent + 2, "{} = {}[{}]".format(sub, values, index))
+                self.fill(container.values[0], sub, False, w, True, indent + 2)
+
+        elif kind is SparselyBin or kind is Categorize:
+            w, q = self.selected(container, ref, weight, indent)
+            if kind is SparselyBin:
+                key = self.fresh("b")
+                self.emit(indent + 1, "if _isnan({}):".format(q))
+                self.fill(container.nanflow, self.child(container.nanflow, static, indent + 2, ref + ".nanflow"), static, w, True, indent + 2)
+                self.emit(indent + 1, "else:")
+                indent += 1
+                self.emit(indent + 1, "{} = int(_floor(({} - {}) / {}))".format(key, q, self.constant(container.origin, "k"), self.constant(container.binWidth, "k")))
+                table = self.constant(container.bins, "t") if static else ref + ".bins"
+            else:
+                key = q
+                table = self.constant(container.pairs, "t") if static else ref + ".pairs"
+            template = self.constant(container.value, "z") if static else ref + ".value"
+            sub = self.fresh("n")
+            self.emit(indent + 1, "{} = {}.get({})".format(sub, table, key))
+            self.emit(indent + 1, "if {} is None:".format(sub))
+            self.emit(indent + 2, "{} = {}[{}] = {}.zero()".format(sub, table, key, template))
+            self.fill(container.value, sub, False, w, True, indent + 1)
+
+        elif kind is Fraction:
+            if container.numeratorSelection is None:
+                raise ContainerException("attempting to compile a container that has no fill rule")
+            w = self.fresh("w")
+            s = self.fresh("s")
+            self.call(container.numeratorSelection, indent, s)
+            self.emit(indent, "{} = {} * {}".format(w, weight, s))
+            self.emit(indent, "{}.entries += {}".format(ref, weight))
+            if not positive:
+                self.emit(indent, "if {} > 0.0:".format(weight))
+            self.fill(container.denominator, self.child(container.denominator, static, indent + (0 if positive else 1), ref + ".denominator"), static, weight, True, indent + (0 if positive else 1))
+            self.emit(indent, "if {} > 0.0:".format(w))
+            self.fill(container.numerator, self.child(container.numerator, static, indent + 1, ref + ".numerator"), static, w, True, indent + 1)
+
+        elif kind is Label or kind is UntypedLabel:
+            for key in sorted(container.pairs):
+                sub = container.pairs[key]
+                self.fill(sub, self.child(sub, static, indent, "{}.pairs[{}]".format(ref, self.constant(key, "k"))), static, weight, positive, indent)
+
+        elif kind is Index or kind is Branch:
+            for i, sub in enumerate(container.values):
+                self.fill(sub, self.child(sub, static, indent, "{}.values[{}]".format(ref, i)), static, weight, positive, indent)
+
+        elif kind is Stack or kind is Partition:
+            if container.expression is None:
+                raise ContainerException("attempting to compile a container that has no fill rule")
+            if not positive:
+                self.emit(indent, "if {} > 0.0:".format(weight))
+                indent += 1
+            x = self.fresh("x")
+            self.call(container.expression, indent, x)
+            self.emit(indent, "{}.entries += {}".format(ref, weight))
+            highs = [low for low, sub in container.cuts[1:]] + [float("nan")]
+            for i, ((low, sub), high) in enumerate(zip(container.cuts, highs)):
+                if kind is Stack:
+                    self.emit(indent, "if {} >= {}:".format(x, self.constant(low, "k")))
+                else:
+                    self.emit(indent, "{} {} >= {} and not {} >= {}:".format("if" if i == 0 else "elif", x, self.constant(low, "k"), x, self.constant(high, "k")))
+                self.fill(sub, self.child(sub, static, indent + 1, "{}.cuts[{}][1]".format(ref, i)), static, weight, True, indent + 1)
+
+        else:
+            self.emit(indent, "{}.fill(datum, {})".format(ref, weight))
+
+    def compile(self, container):
+        self.fill(container, self.constant(container, "n"), True, "weight", False, 1)
+        body = self.lines
+        self.lines = ["def fill(datum, weight=1.0):"]
+        for memo in self.memos:
+            self.emit(1, "{} = _missing".format(memo))
+        self.lines.extend(body)
+        return "\n".join(self.lines) + "\n"
+
+def compileFill(container):
+    """Generate and compile a function fill(datum, weight=1.0) that fills container exactly as container.fill would.
+
+    The function is specialized to the tree as it is now: it keeps references to the container and its subcontainers,
+    which stay valid through in-place merges (+=) but not if parts of the tree are replaced, as + does. Its source is
+    available as fill.source.
+    """
+    counting = KernelGenerator()
+    counting.compile(container)
+
+    generator = KernelGenerator(set(k for k, v in counting.uses.items() if v > 1))
+    source = generator.compile(container)
+    exec compile(source, "<kernel>", "exec") in generator.namespace
+    out = generator.namespace["fill"]
+    out.source = source
+    return out
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Jim Pivarski
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+import multiprocessing
+import Queue
+import sys
+import threading
+
+from histogrammar.defs import increment, combine
+
+def chunked(iterable, chunksize):
+    """Split an iterable into lists of at most chunksize items."""
+    if chunksize < 1:
+        raise ValueError("chunksize ({}) must be at least one".format(chunksize))
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunksize))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+class TreeReduction(object):
+    """Combine a stream of containers with a balanced binary tree of combine, holding at most one partial result per tree level."""
+
+    def __init__(self):
+        self.levels = []
+
+    def add(self, container):
+        level = 0
+        while level < len(self.levels) and self.levels[level] is not None:
+            container = combine(self.levels[level], container)
+            self.levels[level] = None
+            level += 1
+        if level == len(self.levels):
+            self.levels.append(container)
+        else:
+            self.levels[level] = container
+
+    def result(self):
+        out = None
+        for container in self.levels:
+            if container is not None:
+                out = container if out is None else combine(container, out)
+        return out
+
+def reduceTree(containers):
+    """Combine containers pairwise in a balanced binary tree; returns None if there are none."""
+    tree = TreeReduction()
+    for container in containers:
+        tree.add(container)
+    return tree.result()
+
+_template = None
+
+def _initialize(template):
+    global _template
+    _template = template
+
+def _fillChunk(chunk):
+    return reduce(increment, chunk, _template.zero())
+
+def fill(container, iterable, processes=None, chunksize=1000):
+    """Fill container with every datum in iterable using a pool of worker processes.
+
+    Each worker fills zero() replicas of the container with chunks of chunksize data; the partial results are
+    combined pairwise as they arrive and finally added into container, which is returned. Data and filled replicas
+    (including their quantity and selection functions) are pickled between processes.
+    """
+    pool = multiprocessing.Pool(processes, _initialize, (container.zero(),))
+    try:
+        tree = TreeReduction()
+        for partial in pool.imap_unordered(_fillChunk, chunked(iterable, chunksize)):
+            tree.add(partial)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    total = tree.result()
+    if total is not None:
+        container += total
+    return container
+
+def fillBatch(container, data, weights=None, threads=None, chunksize=100000):
+    """Fill container with a batch of data (and optional weights) using a pool of threads.
+
+    Each thread fills its own zero() replica by passing slices of chunksize data to fillBatch, so the input arrays
+    are shared rather than copied or pickled; the replicas are combined pairwise at the end and added into container,
+    which is returned. This pays off when the batch kernels spend their time in NumPy code that releases the GIL.
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize ({}) must be at least one".format(chunksize))
+    if threads is None:
+        threads = multiprocessing.cpu_count()
+    sliced = weights is not None and not isinstance(weights, (int, long, float))   # scalar weights apply to every chunk
+
+    chunks = Queue.Queue()
+    for start in xrange(0, len(data), chunksize):
+        chunks.put(start)
+
+    replicas = [container.zero() for i in xrange(max(1, min(threads, chunks.qsize())))]
+    errors = []
+
+    def work(replica):
+        try:
+            while True:
+                try:
+                    start = chunks.get_nowait()
+                except Queue.Empty:
+                    return
+                if sliced:
+                    replica.fillBatch(data[start:start + chunksize], weights[start:start + chunksize])
+                else:
+                    replica.fillBatch(data[start:start + chunksize], weights)
+        except:
+            errors.append(sys.exc_info())
+
+    workers = [threading.Thread(target=work, args=(replica,)) for replica in replicas]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    if len(errors) > 0:
+        raise errors[0][0], errors[0][1], errors[0][2]
+
+    container += reduceTree(replicas)
+    return container
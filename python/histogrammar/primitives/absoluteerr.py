@@ -56,6 +56,14 @@ class AbsoluteErr(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, AbsoluteErr):
+            self.absoluteSum = self.entries*self.mae + other.entries*other.mae
+            self.entries += other.entries
+            return self
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
         if self.quantity is None or self.selection is None:
             raise RuntimeException("attempting to fill a container that has no fill rule")
@@ -64,7 +72,19 @@ class AbsoluteErr(Factory, Container):
         if w > 0.0:
             q = self.quantity(datum)
             self.entries += w
-            self.absoluteSum += abs(q)
+            self.absoluteSum += w * abs(q)
+
+    def fillBatch(self, data, weights=None):
+        import numpy
+
+        if self.quantity is None or self.selection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        data, w = selectBatch(self.selection, data, weights)
+        if len(w) > 0:
+            q = arrayEvaluate(self.quantity, data).astype(numpy.float64)
+            self.entries += float(w.sum())
+            self.absoluteSum += float((w * numpy.absolute(q)).sum())
 
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
@@ -45,10 +45,10 @@ class AdaptivelyBin(Factory, Container, CentralBinsDistribution, CentrallyBinMet
         if tailDetail < 0.0 or tailDetail > 1.0:
             raise ContainerException("tailDetail parameter ({}) must be between 0.0 and 1.0 inclusive".format(tailDetail))
 
-        self.quantity = quantity
-        self.selection = selection
+        self.quantity = serializable(quantity)
+        self.selection = serializable(selection)
         self.clustering = Clustering1D(num, tailDetail, value, [], float("nan"), float("nan"), 0.0)
-        self.nanflow = nanflow
+        self.nanflow = nanflow.copy()
 
     @property
     def num(self): return self.clustering.num
@@ -76,6 +76,8 @@ class AdaptivelyBin(Factory, Container, CentralBinsDistribution, CentrallyBinMet
         return AdaptivelyBin(self.quantity, self.selection, self.num, self.tailDetail, self.clustering.value, self.nanflow.zero())
 
     def __add__(self, other):
+        if not isinstance(other, AdaptivelyBin):
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
         if self.num != other.num:
             raise ContainerException("cannot add AdaptivelyBin because number of bins is different ({} vs {})".format(self.num, other.num))
         if self.tailDetail != other.tailDetail:
@@ -84,15 +86,52 @@ class AdaptivelyBin(Factory, Container, CentralBinsDistribution, CentrallyBinMet
         out = AdaptivelyBin(self.quantity, self.selection, self.num, self.tailDetail, self.clustering.value, self.nanflow + other.nanflow)
         out.clustering = self.clustering.merge(other.clustering)
         return out
-        
+
+    def __iadd__(self, other):
+        if not isinstance(other, AdaptivelyBin):
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+        if self.num != other.num:
+            raise ContainerException("cannot add AdaptivelyBin because number of bins is different ({} vs {})".format(self.num, other.num))
+        if self.tailDetail != other.tailDetail:
+            raise ContainerException("cannot add AdaptivelyBin because tailDetail parameter is different ({} vs {})".format(self.num, other.num))
+
+        self._distribution = None
+        self.clustering.mergeInPlace(other.clustering)
+        self.nanflow += other.nanflow
+        return self
+
     def fill(self, datum, weight=1.0):
         if self.quantity is None or self.selection is None:
             raise RuntimeException("attempting to fill a container that has no fill rule")
+        self._distribution = None
 
         w = weight * self.selection(datum)
         if w > 0.0:
             q = self.quantity(datum)
-            self.clustering.update(q, datum, w)
+            if self.nan(q):
+                self.clustering.entries += w
+                self.nanflow.fill(datum, w)
+            else:
+                self.clustering.update(q, datum, w)
+
+    def fillBatch(self, data, weights=None):
+        import numpy
+
+        if self.quantity is None or self.selection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+        self._distribution = None
+
+        data, w = selectBatch(self.selection, data, weights)
+        q = arrayEvaluate(self.quantity, data).astype(numpy.float64)
+
+        nan = numpy.isnan(q)
+        indexes = numpy.nonzero(nan)[0]
+        if len(indexes) > 0:
+            self.clustering.entries += float(w[indexes].sum())
+            self.nanflow.fillBatch(arrayTake(data, indexes), w[indexes])
+
+        indexes = numpy.nonzero(~nan)[0]
+        self.clustering.updateBatch(q[indexes], arrayTake(data, indexes), w[indexes])
 
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
@@ -106,6 +145,18 @@ class AdaptivelyBin(Factory, Container, CentralBinsDistribution, CentrallyBinMet
         "tailDetail": self.tailDetail,
         }
 
+    def toJsonStreamFragment(self, fileobj): writeJson(fileobj, {
+        "entries": floatToJson(self.entries),
+        "num": self.num,
+        "bins:type": self.clustering.value.name if self.clustering.value is not None else self.contentType,
+        "bins": ({"center": c, "value": v} for c, v in self.bins),
+        "min": floatToJson(self.min),
+        "max": floatToJson(self.max),
+        "nanflow:type": self.nanflow.name,
+        "nanflow": self.nanflow,
+        "tailDetail": self.tailDetail,
+        })
+
     @staticmethod
     def fromJsonFragment(json):
         if isinstance(json, dict) and set(json.keys()) == set(["entries", "num", "bins:type", "bins", "min", "max", "nanflow:type", "nanflow", "tailDetail"]):
@@ -49,6 +49,15 @@ class Average(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Average):
+            entries = self.entries + other.entries
+            self.mean = (self.entries*self.mean + other.entries*other.mean)/entries
+            self.entries = entries
+            return self
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
         if self.quantity is None or self.selection is None:
             raise RuntimeException("attempting to fill a container that has no fill rule")
@@ -62,6 +71,21 @@ class Average(Factory, Container):
             shift = delta * w / self.entries
             self.mean += shift
 
+    def fillBatch(self, data, weights=None):
+        import numpy
+
+        if self.quantity is None or self.selection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        data, w = selectBatch(self.selection, data, weights)
+        if len(w) > 0:
+            q = arrayEvaluate(self.quantity, data).astype(numpy.float64)
+            entries = float(w.sum())
+            mean = float((q * w).sum()) / entries
+
+            self.entries += entries
+            self.mean += (mean - self.mean) * entries / self.entries
+
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
         "mean": floatToJson(self.mean),
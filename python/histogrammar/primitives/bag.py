@@ -60,6 +60,19 @@ class Bag(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Bag):
+            self.entries += other.entries
+            for value, count in other.values.items():
+                if value in self.values:
+                    self.values[value] += count
+                else:
+                    self.values[value] = count
+            return self
+
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
         if self.quantity is None or self.selection is None:
             raise RuntimeException("attempting to fill a container that has no fill rule")
@@ -79,11 +92,47 @@ class Bag(Factory, Container):
             else:
                 self.values[q] = w
 
+    def fillBatch(self, data, weights=None):
+        import numpy
+
+        if self.quantity is None or self.selection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        data, w = selectBatch(self.selection, data, weights)
+        if len(w) == 0:
+            return
+        q = arrayEvaluate(self.quantity, data, dtype=object)
+
+        if q.ndim == 2:
+            keys, inverse = numpy.unique(q.astype(numpy.float64), axis=0, return_inverse=True)
+            keys = [tuple(x) for x in keys.tolist()]
+        else:
+            keys, inverse = numpy.unique(q, return_inverse=True)
+            keys = keys.tolist()
+            for i, k in enumerate(keys):
+                if isinstance(k, list):
+                    keys[i] = tuple(map(float, k))
+                elif not isinstance(k, (int, long, float, basestring, tuple)):
+                    raise ContainerException("fill rule for Bag must return a number, vector of numbers, or a string, not {}".format(k))
+
+        self.entries += float(w.sum())
+
+        for k, n in zip(keys, numpy.bincount(inverse, weights=w, minlength=len(keys))):
+            if k in self.values:
+                self.values[k] += float(n)
+            else:
+                self.values[k] = float(n)
+
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
         "values": [{"n": n, "v": v} for v, n in sorted(self.values.items())],
         }
 
+    def toJsonStreamFragment(self, fileobj): writeJson(fileobj, {
+        "entries": floatToJson(self.entries),
+        "values": ({"n": n, "v": v} for v, n in self.values.iteritems()),
+        })
+
     @staticmethod
     def fromJsonFragment(json):
         if isinstance(json, dict) and set(json.keys()) == set(["entries", "values"]):
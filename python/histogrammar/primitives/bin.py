@@ -29,7 +29,7 @@ class Bin(Factory, Container):
         out = Bin(len(values), low, high, None, None, None, underflow, overflow, nanflow)
         out.entries = float(entries)
         out.values = values
-        return out
+        return out.specialize()
 
     @staticmethod
     def ing(num, low, high, quantity, selection=unweighted, value=Count(), underflow=Count(), overflow=Count(), nanflow=Count()):
@@ -76,6 +76,28 @@ class Bin(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Bin):
+            if self.low != other.low:
+                raise ContainerException("cannot add Bins because low differs ({} vs {})".format(self.low, other.low))
+            if self.high != other.high:
+                raise ContainerException("cannot add Bins because high differs ({} vs {})".format(self.high, other.high))
+            if len(self.values) != len(other.values):
+                raise ContainerException("cannot add Bins because nubmer of values differs ({} vs {})".format(len(self.values), len(other.values)))
+            if len(self.values) == 0:
+                raise ContainerException("cannot add Bins because number of values is zero")
+
+            self.entries += other.entries
+            for i, v in enumerate(other.values):
+                self.values[i] += v
+            self.underflow += other.underflow
+            self.overflow += other.overflow
+            self.nanflow += other.nanflow
+            return self
+
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     @property
     def num(self): return len(self.values)
 
@@ -112,6 +134,119 @@ class Bin(Factory, Container):
             else:
                 self.values[self.bin(q)].fill(datum, w)
 
+    def fillBatch(self, data, weights=None):
+        import numpy
+
+        if self.quantity is None or self.selection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        levels = self._nestedLevels()
+        if len(levels) > 1:
+            return self._fillNestedBatch(levels, data, weights)
+
+        data, w = selectBatch(self.selection, data, weights)
+        q = arrayEvaluate(self.quantity, data).astype(numpy.float64)
+
+        self.entries += float(w.sum())
+
+        if numbaJit.enabled and all(isinstance(x, Count) for x in (self.underflow, self.overflow, self.nanflow)) and all(isinstance(v, Count) for v in self.values):
+            counts = numbaJit.histogram(q, w, self.low, self.high, self.num)
+            self._addCountsBatch(counts[:self.num])
+            self.underflow.entries += float(counts[self.num])
+            self.overflow.entries += float(counts[self.num + 1])
+            self.nanflow.entries += float(counts[self.num + 2])
+            return
+
+        nan = numpy.isnan(q)
+        with numpy.errstate(invalid="ignore"):
+            under = q < self.low
+            over = q >= self.high
+        inrange = numpy.nonzero(~(under | over | nan))[0]
+
+        index = numpy.floor(self.num * (q[inrange] - self.low) / (self.high - self.low)).astype(numpy.intp)
+        numpy.minimum(index, self.num - 1, index)
+
+        for mask, sub in (under, self.underflow), (over, self.overflow), (nan, self.nanflow):
+            indexes = numpy.nonzero(mask)[0]
+            if len(indexes) > 0:
+                sub.fillBatch(arrayTake(data, indexes), w[indexes])
+
+        self._fillBinsBatch(index, inrange, data, w)
+
+    def _fillBinsBatch(self, index, positions, data, weights):
+        # index[i] is the bin of datum positions[i] in data and weights
+        import numpy
+        if all(isinstance(v, Count) for v in self.values):
+            self._addCountsBatch(numpy.bincount(index, weights=weights[positions], minlength=self.num))
+        else:
+            for b, group in enumerate(arrayGroups(index, self.num)):
+                if len(group) > 0:
+                    indexes = positions[group]
+                    self.values[b].fillBatch(arrayTake(data, indexes), weights[indexes])
+
+    def _addCountsBatch(self, counts):
+        for i, entries in enumerate(counts):
+            if entries > 0.0:
+                self.values[i].entries += float(entries)
+
+    def _nestedLevels(self):
+        # the Bins of a Bin(Bin(...Count)) tree, one per level, if every level is uniformly binned with Count flows
+        levels = [self]
+        cells = [self]
+        while True:
+            if not all(isinstance(x, Count) for c in cells for x in (c.underflow, c.overflow, c.nanflow)):
+                return [self]
+            values = [v for c in cells for v in c.values]
+            if all(isinstance(v, Count) for v in values):
+                return levels
+            first = values[0]
+            if not all(isinstance(v, Bin) and v.quantity is first.quantity and v.selection is first.selection and v.low == first.low and v.high == first.high and v.num == first.num for v in values):
+                return [self]
+            levels.append(first)
+            cells = values
+
+    def _fillNestedBatch(self, levels, data, weights):
+        # one ravel_multi_index + bincount per level instead of one Bin.fill per datum per level
+        import numpy
+
+        w = arrayWeights(weights, len(data))
+        cell = numpy.zeros(len(data), dtype=numpy.intp)
+        cells = [self]
+
+        for depth, level in enumerate(levels):
+            if level.quantity is None or level.selection is None:
+                raise RuntimeException("attempting to fill a container that has no fill rule")
+
+            if level.selection is not unweighted:
+                w = w * arrayEvaluate(level.selection, data)
+            indexes = numpy.nonzero(w > 0.0)[0]
+            data, w, cell = arrayTake(data, indexes), w[indexes], cell[indexes]
+
+            num = level.num
+            q = arrayEvaluate(level.quantity, data).astype(numpy.float64)
+            with numpy.errstate(invalid="ignore"):
+                slot = numpy.minimum(numpy.floor(num * (q - level.low) / (level.high - level.low)), num - 1)
+                slot[q < level.low] = num
+                slot[q >= level.high] = num + 1
+            slot[numpy.isnan(q)] = num + 2
+            slot = slot.astype(numpy.intp)
+
+            counts = numpy.bincount(numpy.ravel_multi_index((cell, slot), (len(cells), num + 3)), weights=w, minlength=len(cells) * (num + 3)).reshape(len(cells), num + 3)
+            for c, row in zip(cells, counts):
+                c.entries += float(row.sum())
+                c.underflow.entries += float(row[num])
+                c.overflow.entries += float(row[num + 1])
+                c.nanflow.entries += float(row[num + 2])
+
+            if depth == len(levels) - 1:
+                for c, row in zip(cells, counts):
+                    c._addCountsBatch(row[:num])
+            else:
+                indexes = numpy.nonzero(slot < num)[0]
+                data, w = arrayTake(data, indexes), w[indexes]
+                cell = cell[indexes] * num + slot[indexes]
+                cells = [v for c in cells for v in c.values]
+
     def toJsonFragment(self): return {
         "low": floatToJson(self.low),
         "high": floatToJson(self.high),
@@ -126,6 +261,20 @@ class Bin(Factory, Container):
         "nanflow": self.nanflow.toJsonFragment(),
         }
 
+    def toJsonStreamFragment(self, fileobj): writeJson(fileobj, {
+        "low": floatToJson(self.low),
+        "high": floatToJson(self.high),
+        "entries": floatToJson(self.entries),
+        "values:type": self.values[0].name,
+        "values": (x for x in self.values),
+        "underflow:type": self.underflow.name,
+        "underflow": self.underflow,
+        "overflow:type": self.overflow.name,
+        "overflow": self.overflow,
+        "nanflow:type": self.nanflow.name,
+        "nanflow": self.nanflow,
+        })
+
     @staticmethod
     def fromJsonFragment(json):
         if isinstance(json, dict) and set(json.keys()) == set(["low", "high", "entries", "values:type", "values", "underflow:type", "underflow", "overflow:type", "overflow", "nanflow:type", "nanflow"]):
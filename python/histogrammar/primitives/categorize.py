@@ -34,8 +34,8 @@ class Categorize(Factory, Container):
 
     def __init__(self, quantity, selection=unweighted, value=Count()):
         self.entries = 0.0
-        self.quantity = quantity
-        self.selection = selection
+        self.quantity = serializable(quantity)
+        self.selection = serializable(selection)
         self.value = value
         self.pairs = {}
         super(Categorize, self).__init__()
@@ -74,6 +74,19 @@ class Categorize(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Categorize):
+            self.entries += other.entries
+            for k, v in other.pairs.items():
+                if k in self.pairs:
+                    self.pairs[k] += v
+                else:
+                    self.pairs[k] = v.copy()
+            return self
+
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
         if self.quantity is None or self.selection is None:
             raise RuntimeException("attempting to fill a container that has no fill rule")
@@ -88,12 +101,42 @@ class Categorize(Factory, Container):
                 self.pairs[q] = self.value.zero()
             self.pairs[q].fill(datum, w)
 
+    def fillBatch(self, data, weights=None):
+        import numpy
+
+        if self.quantity is None or self.selection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        data, w = selectBatch(self.selection, data, weights)
+        q = arrayEvaluate(self.quantity, data, dtype=object)
+
+        self.entries += float(w.sum())
+
+        keys, inverse = numpy.unique(q, return_inverse=True)
+        keys = keys.tolist()
+        for k in keys:
+            if k not in self.pairs:
+                self.pairs[k] = self.value.zero()
+
+        if isinstance(self.value, Count):
+            for k, entries in zip(keys, numpy.bincount(inverse, weights=w, minlength=len(keys))):
+                self.pairs[k].entries += float(entries)
+        else:
+            for k, group in zip(keys, arrayGroups(inverse, len(keys))):
+                self.pairs[k].fillBatch(arrayTake(data, group), w[group])
+
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
         "type": self.value.name if isinstance(self.value, Container) else self.value,
         "data": {k: v.toJsonFragment() for k, v in self.pairs.items()},
         }
 
+    def toJsonStreamFragment(self, fileobj): writeJson(fileobj, {
+        "entries": floatToJson(self.entries),
+        "type": self.value.name if isinstance(self.value, Container) else self.value,
+        "data": JsonObject(self.pairs.iteritems()),
+        })
+
     @staticmethod
     def fromJsonFragment(json):
         if isinstance(json, dict) and set(json.keys()) == set(["entries", "type", "data"]):
@@ -109,7 +152,7 @@ class Categorize(Factory, Container):
                 raise JsonFormatException(json, "Categorize.type")
 
             if isinstance(json["data"], dict):
-                pairs = {k: factory.fromJsonFragment(v) for k, v in json["data"].items()}
+                pairs = {k: lazyFragment(factory, v) for k, v in json["data"].items()}
             else:
                 raise JsonFormatException(json, "Categorize.data")
 
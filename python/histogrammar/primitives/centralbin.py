@@ -49,15 +49,17 @@ class CentrallyBin(Factory, Container, CentralBinsDistribution, CentrallyBinMeth
         self.min = float("nan")
         self.max = float("nan")
 
-        self.quantity = quantity
-        self.selection = selection
+        self.quantity = serializable(quantity)
+        self.selection = serializable(selection)
         self.value = value
-        self.nanflow = nanflow
+        self.nanflow = nanflow.copy()
 
     def zero(self):
         return CentrallyBin(map(lambda (x, v): x, self.bins), self.quantity, self.selection, self.value, self.nanflow.zero())
 
     def __add__(self, other):
+        if not isinstance(other, CentrallyBin):
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
         if self.centers != other.centers:
             raise ContainerException("cannot add CentrallyBin because centers are different:\n    {}\nvs\n    {}".format(self.centers, other.centers))
 
@@ -70,9 +72,38 @@ class CentrallyBin(Factory, Container, CentralBinsDistribution, CentrallyBinMeth
         out.max = maxplus(self.max, other.max)
         return out
 
+    def __iadd__(self, other):
+        if not isinstance(other, CentrallyBin):
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+        if self.centers != other.centers:
+            raise ContainerException("cannot add CentrallyBin because centers are different:\n    {}\nvs\n    {}".format(self.centers, other.centers))
+
+        for i, ((c, v1), (_, v2)) in enumerate(zip(self.bins, other.bins)):
+            v1 += v2
+            self.bins[i] = (c, v1)
+
+        self._distribution = None
+        self.entries += other.entries
+        self.nanflow += other.nanflow
+        self.min = minplus(self.min, other.min)
+        self.max = maxplus(self.max, other.max)
+        return self
+
+    @property
+    def midpoints(self):
+        # boundaries between neighboring centers, recomputed only when the bins list is replaced
+        if getattr(self, "_midpointsOf", None) is not self.bins:
+            self._midpoints = [(c1 + c2)/2.0 for (c1, _), (c2, _) in zip(self.bins[:-1], self.bins[1:])]
+            self._midpointsOf = self.bins
+        return self._midpoints
+
+    def index(self, x):
+        return bisect.bisect_right(self.midpoints, x)
+
     def fill(self, datum, weight=1.0):
         if self.quantity is None or self.selection is None:
             raise RuntimeException("attempting to fill a container that has no fill rule")
+        self._distribution = None
 
         w = weight * self.selection(datum)
 
@@ -83,13 +114,45 @@ class CentrallyBin(Factory, Container, CentralBinsDistribution, CentrallyBinMeth
             if self.nan(q):
                 self.nanflow.fill(datum, w)
             else:
-                self.bins[self.index(q)][1].fill(datum, weight)
+                self.bins[self.index(q)][1].fill(datum, w)
 
             if math.isnan(self.min) or q < self.min:
                 self.min = q
             if math.isnan(self.max) or q > self.max:
                 self.max = q
 
+    def fillBatch(self, data, weights=None):
+        import numpy
+
+        if self.quantity is None or self.selection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+        self._distribution = None
+
+        data, w = selectBatch(self.selection, data, weights)
+        q = arrayEvaluate(self.quantity, data).astype(numpy.float64)
+
+        self.entries += float(w.sum())
+
+        nan = numpy.isnan(q)
+        indexes = numpy.nonzero(nan)[0]
+        if len(indexes) > 0:
+            self.nanflow.fillBatch(arrayTake(data, indexes), w[indexes])
+
+        indexes = numpy.nonzero(~nan)[0]
+        if len(indexes) > 0:
+            self.min = minplus(self.min, float(q[indexes].min()))
+            self.max = maxplus(self.max, float(q[indexes].max()))
+
+        index = numpy.searchsorted(numpy.array(self.midpoints), q[indexes], side="right")
+        if all(isinstance(v, Count) for c, v in self.bins):
+            for (c, v), entries in zip(self.bins, numpy.bincount(index, weights=w[indexes], minlength=len(self.bins))):
+                v.entries += float(entries)
+        else:
+            for (c, v), group in zip(self.bins, arrayGroups(index, len(self.bins))):
+                if len(group) > 0:
+                    subset = indexes[group]
+                    v.fillBatch(arrayTake(data, subset), w[subset])
+
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
         "bins:type": self.bins[0][1].name,
@@ -100,6 +163,16 @@ class CentrallyBin(Factory, Container, CentralBinsDistribution, CentrallyBinMeth
         "nanflow": self.nanflow.toJsonFragment(),
         }
 
+    def toJsonStreamFragment(self, fileobj): writeJson(fileobj, {
+        "entries": floatToJson(self.entries),
+        "bins:type": self.bins[0][1].name,
+        "bins": ({"center": floatToJson(c), "value": v} for c, v in self.bins),
+        "min": floatToJson(self.min),
+        "max": floatToJson(self.max),
+        "nanflow:type": self.nanflow.name,
+        "nanflow": self.nanflow,
+        })
+
     @staticmethod
     def fromJsonFragment(json):
         if isinstance(json, dict) and set(json.keys()) == set(["entries", "bins:type", "bins", "min", "max", "nanflow:type", "nanflow"]):
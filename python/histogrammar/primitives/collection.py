@@ -60,7 +60,7 @@ class Limit(Factory, Container):
     def __add__(self, other):
         if isinstance(other, Limit):
             if self.limit != other.limit:
-                raise ContainerExeption("cannot add Limit because they have different limits ({} vs {})".format(self.limit, other.limit))
+                raise ContainerException("cannot add Limit because they have different limits ({} vs {})".format(self.limit, other.limit))
             else:
                 newentries = self.entries + other.entries
                 if newentries > self.limit:
@@ -73,6 +73,21 @@ class Limit(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Limit):
+            if self.limit != other.limit:
+                raise ContainerException("cannot add Limit because they have different limits ({} vs {})".format(self.limit, other.limit))
+            else:
+                self.entries += other.entries
+                if self.entries > self.limit:
+                    self.value = None
+                else:
+                    self.value += other.value
+                return self
+
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
         self.entries += weight
         if self.entries > self.limit:
@@ -80,6 +95,15 @@ class Limit(Factory, Container):
         else:
             self.value.fill(datum, weight)
 
+    def fillBatch(self, data, weights=None):
+        import numpy
+        weights = arrayWeights(weights, len(data))
+        if len(weights) > 0 and (self.entries + numpy.cumsum(weights)).max() > self.limit:
+            self.value = None
+        elif self.value is not None:
+            self.value.fillBatch(data, weights)
+        self.entries += float(weights.sum())
+
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
         "limit": floatToJson(self.limit),
@@ -87,6 +111,13 @@ class Limit(Factory, Container):
         "data": None if self.value is None else self.value.toJsonFragment(),
         }
 
+    def toJsonStreamFragment(self, fileobj): writeJson(fileobj, {
+        "entries": floatToJson(self.entries),
+        "limit": floatToJson(self.limit),
+        "type": self.contentType,
+        "data": self.value,
+        })
+
     @staticmethod
     def fromJsonFragment(json):
         if isinstance(json, dict) and set(json.keys()) == set(["entries", "limit", "type", "data"]):
@@ -186,9 +217,28 @@ class Label(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Label):
+            if self.keySet != other.keySet:
+                raise ContainerException("cannot add Labels because keys differ:\n    {}\n    {}".format(", ".join(sorted(self.keys)), ", ".join(sorted(other.keys))))
+
+            for k in self.keys:
+                self.pairs[k] += other.pairs[k]
+            self.entries += other.entries
+            return self
+
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
-        for x in self.values:
-            x.fill(datum, weight)
+        with fillCache.filling(datum):
+            for x in self.values:
+                x.fill(datum, weight)
+
+    def fillBatch(self, data, weights=None):
+        with fillCache.filling(data):
+            for x in self.values:
+                x.fillBatch(data, weights)
 
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
@@ -196,6 +246,12 @@ class Label(Factory, Container):
         "data": {k: v.toJsonFragment() for k, v in self.pairs.items()},
         }
 
+    def toJsonStreamFragment(self, fileobj): writeJson(fileobj, {
+        "entries": floatToJson(self.entries),
+        "type": self.values[0].name,
+        "data": JsonObject(self.pairs.iteritems()),
+        })
+
     @staticmethod
     def fromJsonFragment(json):
         if isinstance(json, dict) and set(json.keys()) == set(["entries", "type", "data"]):
@@ -210,7 +266,7 @@ class Label(Factory, Container):
                 raise JsonFormatException(json, "Label.type")
 
             if isinstance(json["data"], dict):
-                pairs = {k: factory.fromJsonFragment(v) for k, v in json["data"].items()}
+                pairs = {k: lazyFragment(factory, v) for k, v in json["data"].items()}
             else:
                 raise JsonFormatException(json, "Label.data")
 
@@ -284,15 +340,39 @@ class UntypedLabel(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, UntypedLabel):
+            if self.keySet != other.keySet:
+                raise ContainerException("cannot add UntypedLabels because keys differ:\n    {}\n    {}".format(", ".join(sorted(self.keys)), ", ".join(sorted(other.keys))))
+
+            for k in self.keys:
+                self.pairs[k] += other.pairs[k]
+            self.entries += other.entries
+            return self
+
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
-        for x in self.values:
-            x.fill(datum, weight)
+        with fillCache.filling(datum):
+            for x in self.values:
+                x.fill(datum, weight)
+
+    def fillBatch(self, data, weights=None):
+        with fillCache.filling(data):
+            for x in self.values:
+                x.fillBatch(data, weights)
 
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
         "data": {k: {"type": v.name, "data": v.toJsonFragment()} for k, v in self.pairs.items()},
         }
 
+    def toJsonStreamFragment(self, fileobj): writeJson(fileobj, {
+        "entries": floatToJson(self.entries),
+        "data": JsonObject((k, {"type": v.name, "data": v}) for k, v in self.pairs.iteritems()),
+        })
+
     @staticmethod
     def fromJsonFragment(json):
         if isinstance(json, dict) and set(json.keys()) == set(["entries", "data"]):
@@ -306,7 +386,7 @@ class UntypedLabel(Factory, Container):
                 for k, v in json["data"].items():
                     if isinstance(v, dict) and set(v.keys()) == set(["type", "data"]):
                         factory = Factory.registered[v["type"]]
-                        pairs[k] = factory.fromJsonFragment(v["data"])
+                        pairs[k] = lazyFragment(factory, v["data"])
 
                     else:
                         raise JsonFormatException(k, "UntypedLabel.data {}".format(v))
@@ -392,9 +472,30 @@ class Index(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Index):
+            if self.size != other.size:
+                raise ContainerException("cannot add Indexes because they have different sizes: ({} vs {})".format(self.size, other.size))
+
+            values = list(self.values)
+            for i, v in enumerate(other.values):
+                values[i] += v
+            self.values = tuple(values)
+            self.entries += other.entries
+            return self
+
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
-        for x in self.values:
-            x.fill(datum, weight)
+        with fillCache.filling(datum):
+            for x in self.values:
+                x.fill(datum, weight)
+
+    def fillBatch(self, data, weights=None):
+        with fillCache.filling(data):
+            for x in self.values:
+                x.fillBatch(data, weights)
 
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
@@ -402,6 +503,12 @@ class Index(Factory, Container):
         "data": [x.toJsonFragment() for x in self.values],
         }
 
+    def toJsonStreamFragment(self, fileobj): writeJson(fileobj, {
+        "entries": floatToJson(self.entries),
+        "type": self.values[0].name,
+        "data": (x for x in self.values),
+        })
+
     @staticmethod
     def fromJsonFragment(json):
         if isinstance(json, dict) and set(json.keys()) == set(["entries", "type", "data"]):
@@ -416,7 +523,7 @@ class Index(Factory, Container):
                 raise JsonFormatException(json, "Index.type")
 
             if isinstance(json["data"], list):
-                values = [factory.fromJsonFragment(x) for x in json["data"]]
+                values = [lazyFragment(factory, x) for x in json["data"]]
             else:
                 raise JsonFormatException(json, "Index.data")
 
@@ -495,15 +602,41 @@ class Branch(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Branch):
+            if self.size != other.size:
+                raise ContainerException("cannot add Branches because they have different sizes: ({} vs {})".format(self.size, other.size))
+
+            values = list(self.values)
+            for i, v in enumerate(other.values):
+                values[i] += v
+            self.values = tuple(values)
+            self.entries += other.entries
+            return self
+
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
-        for x in self.values:
-            x.fill(datum, weight)
+        with fillCache.filling(datum):
+            for x in self.values:
+                x.fill(datum, weight)
+
+    def fillBatch(self, data, weights=None):
+        with fillCache.filling(data):
+            for x in self.values:
+                x.fillBatch(data, weights)
 
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
         "data": [{x.name: x.toJsonFragment()} for x in self.values],
         }
 
+    def toJsonStreamFragment(self, fileobj): writeJson(fileobj, {
+        "entries": floatToJson(self.entries),
+        "data": ({x.name: x} for x in self.values),
+        })
+
     @staticmethod
     def fromJsonFragment(json):
         if isinstance(json, dict) and set(json.keys()) == set(["entries", "data"]):
@@ -518,7 +651,7 @@ class Branch(Factory, Container):
                     if isinstance(x, dict) and len(x) == 1:
                         (k, v), = x.items()
                         factory = Factory.registered[k]
-                        values.append(factory.fromJsonFragment(v))
+                        values.append(lazyFragment(factory, v))
                     else:
                         raise JsonFormatException(v, "Branch.data {}".format(i))
 
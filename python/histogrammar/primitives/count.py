@@ -43,10 +43,24 @@ class Count(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Count):
+            self.entries += other.entries
+            return self
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
         if weight > 0.0:
             self.entries += weight
 
+    def fillBatch(self, data, weights=None):
+        if weights is None:
+            self.entries += len(data)
+        else:
+            w = arrayWeights(weights, len(data))
+            self.entries += float(w[w > 0.0].sum())
+
     def toJsonFragment(self): return floatToJson(self.entries)
 
     @staticmethod
@@ -59,6 +59,17 @@ class Deviate(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Deviate):
+            entries = self.entries + other.entries
+            mean = (self.entries*self.mean + other.entries*other.mean)/entries
+            self.varianceTimesEntries = self.varianceTimesEntries + other.varianceTimesEntries + self.entries*self.mean**2 + other.entries*other.mean**2 - 2.0*mean*(self.entries*self.mean + other.entries*other.mean) + mean*mean*entries
+            self.entries = entries
+            self.mean = mean
+            return self
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
         if self.quantity is None or self.selection is None:
             raise RuntimeException("attempting to fill a container that has no fill rule")
@@ -73,6 +84,26 @@ class Deviate(Factory, Container):
             self.mean += shift
             self.varianceTimesEntries += w * delta * (q - self.mean)
 
+    def fillBatch(self, data, weights=None):
+        import numpy
+
+        if self.quantity is None or self.selection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        data, w = selectBatch(self.selection, data, weights)
+        if len(w) > 0:
+            q = arrayEvaluate(self.quantity, data).astype(numpy.float64)
+            entries = float(w.sum())
+            mean = float((q * w).sum()) / entries
+            varianceTimesEntries = float((w * (q - mean)**2).sum())
+
+            # Chan et al.'s pairwise update; algebraically the same as Deviate.__add__
+            delta = mean - self.mean
+            oldEntries = self.entries
+            self.entries += entries
+            self.mean += delta * entries / self.entries
+            self.varianceTimesEntries += varianceTimesEntries + delta**2 * oldEntries * entries / self.entries
+
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
         "mean": floatToJson(self.mean),
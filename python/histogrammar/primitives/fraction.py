@@ -35,7 +35,7 @@ class Fraction(Factory, Container):
 
     def __init__(self, numeratorSelection, value):
         self.entries = 0.0
-        self.numeratorSelection = numeratorSelection
+        self.numeratorSelection = serializable(numeratorSelection)
         if value is not None:
             self.numerator = value.zero()
             self.denominator = value.zero()
@@ -49,12 +49,22 @@ class Fraction(Factory, Container):
     def __add__(self, other):
         if isinstance(other, Fraction):
             out = Fraction(self.numeratorSelection, None)
+            out.entries = self.entries + other.entries
             out.numerator = self.numerator + other.numerator
             out.denominator = self.denominator + other.denominator
             return out
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Fraction):
+            self.entries += other.entries
+            self.numerator += other.numerator
+            self.denominator += other.denominator
+            return self
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
         if self.numeratorSelection is None:
             raise RuntimeException("attempting to fill a container that has no fill rule")
@@ -62,10 +72,26 @@ class Fraction(Factory, Container):
         w = weight * self.numeratorSelection(datum)
 
         self.entries += weight
-        if weight > 0.0:
-            self.denominator.fill(datum, weight)
-        if w > 0.0:
-            self.numerator.fill(datum, w)
+        with fillCache.filling(datum):
+            if weight > 0.0:
+                self.denominator.fill(datum, weight)
+            if w > 0.0:
+                self.numerator.fill(datum, w)
+
+    def fillBatch(self, data, weights=None):
+        import numpy
+
+        if self.numeratorSelection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        weights = arrayWeights(weights, len(data))
+        w = weights * arrayEvaluate(self.numeratorSelection, data)
+
+        self.entries += float(weights.sum())
+        indexes = numpy.nonzero(weights > 0.0)[0]
+        self.denominator.fillBatch(arrayTake(data, indexes), weights[indexes])
+        indexes = numpy.nonzero(w > 0.0)[0]
+        self.numerator.fillBatch(arrayTake(data, indexes), w[indexes])
 
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
@@ -74,6 +100,13 @@ class Fraction(Factory, Container):
         "denominator": self.denominator.toJsonFragment(),
         }
 
+    def toJsonStreamFragment(self, fileobj): writeJson(fileobj, {
+        "entries": floatToJson(self.entries),
+        "type": self.numerator.name,
+        "numerator": self.numerator,
+        "denominator": self.denominator,
+        })
+
     @staticmethod
     def fromJsonFragment(json):
         if isinstance(json, dict) and set(json.keys()) == set(["entries", "type", "numerator", "denominator"]):
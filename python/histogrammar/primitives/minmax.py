@@ -51,6 +51,14 @@ class Minimize(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Minimize):
+            self.entries += other.entries
+            self.min = minplus(self.min, other.min)
+            return self
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
         if self.quantity is None or self.selection is None:
             raise RuntimeException("attempting to fill a container that has no fill rule")
@@ -62,6 +70,19 @@ class Minimize(Factory, Container):
             if math.isnan(self.min) or q < self.min:
                 self.min = q
 
+    def fillBatch(self, data, weights=None):
+        import numpy
+
+        if self.quantity is None or self.selection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        data, w = selectBatch(self.selection, data, weights)
+        if len(w) > 0:
+            q = arrayEvaluate(self.quantity, data).astype(numpy.float64)
+            self.entries += float(w.sum())
+            if not numpy.isnan(q).all():
+                self.min = minplus(self.min, float(numpy.nanmin(q)))
+
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
         "min": floatToJson(self.min),
@@ -128,6 +149,14 @@ class Maximize(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Maximize):
+            self.entries += other.entries
+            self.max = maxplus(self.max, other.max)
+            return self
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
         if self.quantity is None or self.selection is None:
             raise RuntimeException("attempting to fill a container that has no fill rule")
@@ -139,6 +168,19 @@ class Maximize(Factory, Container):
             if math.isnan(self.max) or q > self.max:
                 self.max = q
 
+    def fillBatch(self, data, weights=None):
+        import numpy
+
+        if self.quantity is None or self.selection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        data, w = selectBatch(self.selection, data, weights)
+        if len(w) > 0:
+            q = arrayEvaluate(self.quantity, data).astype(numpy.float64)
+            self.entries += float(w.sum())
+            if not numpy.isnan(q).all():
+                self.max = maxplus(self.max, float(numpy.nanmax(q)))
+
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
         "max": floatToJson(self.max),
@@ -33,7 +33,7 @@ class Partition(Factory, Container):
 
     def __init__(self, value, expression, *cuts):
         self.entries = 0.0
-        self.expression = expression
+        self.expression = serializable(expression)
         if value is None:
             self.cuts = cuts
         else:
@@ -59,6 +59,22 @@ class Partition(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Partition):
+            if self.thresholds != other.thresholds:
+                raise ContainerException("cannot add Partition because cut thresholds differ")
+
+            cuts = []
+            for (k, v1), (_, v2) in zip(self.cuts, other.cuts):
+                v1 += v2
+                cuts.append((k, v1))
+            self.cuts = tuple(cuts)
+            self.entries += other.entries
+            return self
+
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
         if self.expression is None:
             raise RuntimeException("attempting to fill a container that has no fill rule")
@@ -66,17 +82,41 @@ class Partition(Factory, Container):
         if weight > 0.0:
             value = self.expression(datum)
             self.entries += weight
-            for (low, sub), (high, _) in zip(self.cuts, self.cuts[1:] + (float("nan"), None)):
+            for (low, sub), (high, _) in zip(self.cuts, self.cuts[1:] + ((float("nan"), None),)):
                 if value >= low and not value >= high:
                     sub.fill(datum, weight)
                     break
 
+    def fillBatch(self, data, weights=None):
+        import numpy
+
+        if self.expression is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        weights = arrayWeights(weights, len(data))
+        indexes = numpy.nonzero(weights > 0.0)[0]
+        data = arrayTake(data, indexes)
+        weights = weights[indexes]
+        value = arrayEvaluate(self.expression, data).astype(numpy.float64)
+
+        self.entries += float(weights.sum())
+        with numpy.errstate(invalid="ignore"):
+            for (low, sub), (high, _) in zip(self.cuts, self.cuts[1:] + ((float("nan"), None),)):
+                indexes = numpy.nonzero((value >= low) & ~(value >= high))[0]
+                sub.fillBatch(arrayTake(data, indexes), weights[indexes])
+
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
         "type": self.cuts[0][1].name,
         "data": [{"atleast": floatToJson(atleast), "data": sub.toJsonFragment()} for atleast, sub in self.cuts],
         }
 
+    def toJsonStreamFragment(self, fileobj): writeJson(fileobj, {
+        "entries": floatToJson(self.entries),
+        "type": self.cuts[0][1].name,
+        "data": ({"atleast": floatToJson(atleast), "data": sub} for atleast, sub in self.cuts),
+        })
+
     @staticmethod
     def fromJsonFragment(json):
         if isinstance(json, dict) and set(json.keys()) == set(["entries", "type", "data"]):
@@ -37,8 +37,8 @@ class Quantile(Factory, Container):
         if target < 0.0 or target > 1.0:
             raise ContainerException("target ({}) must be between 0 and 1, inclusive".format(target))
         self.target = target
-        self.quantity = quantity
-        self.selection = selection
+        self.quantity = serializable(quantity)
+        self.selection = serializable(selection)
         self.entries = 0.0
         self.estimate = float("nan")
         self.cumulativeDeviation = 0.0
@@ -65,6 +65,20 @@ class Quantile(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Quantile):
+            if self.target == other.target:
+                if math.isnan(self.estimate):
+                    self.estimate = other.estimate
+                elif not math.isnan(other.estimate):
+                    self.estimate = (self.estimate*self.entries + other.estimate*other.entries) / (self.entries + other.entries)
+                self.entries += other.entries
+                return self
+            else:
+                raise ContainerException("cannot add Quantiles because targets do not match ({} vs {})".format(self.target, other.target))
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
         if self.quantity is None or self.selection is None:
             raise RuntimeException("attempting to fill a container that has no fill rule")
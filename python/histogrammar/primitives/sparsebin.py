@@ -59,19 +59,40 @@ class SparselyBin(Factory, Container):
             if self.origin != other.origin:
                 raise ContainerException("cannot add SparselyBins because origin differs ({} vs {})".format(self.origin, other.origin))
 
-            out = SparselyBin(self.binWidth, self.quantity, self.selection, self.value, self.nanflow + other.nanflow)
+            out = SparselyBin(self.binWidth, self.quantity, self.selection, self.value, self.nanflow + other.nanflow, self.origin)
             out.entries = self.entries + other.entries
-            out.bins = self.bins
-            for i, v in other.bins.items():
-                if i in out.bins:
-                    out.bins[i] += v
+            out.bins = {}
+            for i in set(self.bins).union(other.bins):
+                if i in self.bins and i in other.bins:
+                    out.bins[i] = self.bins[i] + other.bins[i]
+                elif i in self.bins:
+                    out.bins[i] = self.bins[i].copy()
                 else:
-                    out.bins[i] = v
+                    out.bins[i] = other.bins[i].copy()
             return out
 
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, SparselyBin):
+            if self.binWidth != other.binWidth:
+                raise ContainerException("cannot add SparselyBins because binWidth differs ({} vs {})".format(self.binWidth, other.binWidth))
+            if self.origin != other.origin:
+                raise ContainerException("cannot add SparselyBins because origin differs ({} vs {})".format(self.origin, other.origin))
+
+            self.entries += other.entries
+            for i, v in other.bins.items():
+                if i in self.bins:
+                    self.bins[i] += v
+                else:
+                    self.bins[i] = v.copy()
+            self.nanflow += other.nanflow
+            return self
+
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     @property
     def numFilled(self):
         return len(self.bins)
@@ -136,9 +157,54 @@ class SparselyBin(Factory, Container):
             else:
                 b = self.bin(q)
                 if b not in self.bins:
-                    self.bins[b] = self.value.copy()
+                    self.bins[b] = self.value.zero()
                 self.bins[b].fill(datum, w)
 
+    def fillBatch(self, data, weights=None):
+        import numpy
+
+        if self.quantity is None or self.selection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        data, w = selectBatch(self.selection, data, weights)
+        q = arrayEvaluate(self.quantity, data).astype(numpy.float64)
+
+        nan = numpy.isnan(q)
+        indexes = numpy.nonzero(~nan)[0]
+        with numpy.errstate(over="ignore"):
+            index = numpy.floor((q[indexes] - self.origin) / self.binWidth)
+        if not numpy.isfinite(index).all():
+            raise OverflowError("cannot convert float infinity to integer")   # as int(...) in bin raises for one datum
+
+        self.entries += float(w.sum())
+
+        nanIndexes = numpy.nonzero(nan)[0]
+        if len(nanIndexes) > 0:
+            self.nanflow.fillBatch(arrayTake(data, nanIndexes), w[nanIndexes])
+
+        # bin numbers beyond the range of int64 are Python longs, one datum at a time
+        huge = numpy.abs(index) >= 2.0**63
+        for i in indexes[huge]:
+            b = self.bin(q[i])
+            if b not in self.bins:
+                self.bins[b] = self.value.zero()
+            self.bins[b].fillBatch(arrayTake(data, [i]), w[[i]])
+        indexes, index = indexes[~huge], index[~huge]
+
+        bins, inverse = numpy.unique(index.astype(numpy.int64), return_inverse=True)
+        bins = [int(b) for b in bins]
+        for b in bins:
+            if b not in self.bins:
+                self.bins[b] = self.value.zero()
+
+        if isinstance(self.value, Count):
+            for b, entries in zip(bins, numpy.bincount(inverse, weights=w[indexes], minlength=len(bins))):
+                self.bins[b].entries += float(entries)
+        else:
+            for b, group in zip(bins, arrayGroups(inverse, len(bins))):
+                subset = indexes[group]
+                self.bins[b].fillBatch(arrayTake(data, subset), w[subset])
+
     def toJsonFragment(self): return {
         "binWidth": floatToJson(self.binWidth),
         "entries": floatToJson(self.entries),
@@ -149,6 +215,16 @@ class SparselyBin(Factory, Container):
         "origin": self.origin,
         }
 
+    def toJsonStreamFragment(self, fileobj): writeJson(fileobj, {
+        "binWidth": floatToJson(self.binWidth),
+        "entries": floatToJson(self.entries),
+        "bins:type": self.value.name if self.value is not None else self.contentType,
+        "bins": JsonObject((str(i), v) for i, v in self.bins.iteritems()),
+        "nanflow:type": self.nanflow.name,
+        "nanflow": self.nanflow,
+        "origin": self.origin,
+        })
+
     @staticmethod
     def fromJsonFragment(json):
         if isinstance(json, dict) and set(json.keys()) == set(["binWidth", "entries", "bins:type", "bins", "nanflow:type", "nanflow", "origin"]):
@@ -49,6 +49,14 @@ class Sum(Factory, Container):
         else:
             raise ContainerException("cannot add {} and {}".format(self.name, other.name))
 
+    def __iadd__(self, other):
+        if isinstance(other, Sum):
+            self.entries += other.entries
+            self.sum += other.sum
+            return self
+        else:
+            raise ContainerException("cannot add {} and {}".format(self.name, other.name))
+
     def fill(self, datum, weight=1.0):
         if self.quantity is None or self.selection is None:
             raise RuntimeException("attempting to fill a container that has no fill rule")
@@ -59,6 +67,18 @@ class Sum(Factory, Container):
             self.entries += w
             self.sum += q * w
 
+    def fillBatch(self, data, weights=None):
+        import numpy
+
+        if self.quantity is None or self.selection is None:
+            raise RuntimeException("attempting to fill a container that has no fill rule")
+
+        data, w = selectBatch(self.selection, data, weights)
+        if len(w) > 0:
+            q = arrayEvaluate(self.quantity, data).astype(numpy.float64)
+            self.entries += float(w.sum())
+            self.sum += float((q * w).sum())
+
     def toJsonFragment(self): return {
         "entries": floatToJson(self.entries),
         "sum": floatToJson(self.sum),
@@ -14,10 +14,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import __builtin__
+import ast
 import bisect
+import contextlib
 import functools
+import heapq
+import json as jsonlib
 import marshal
 import math
+import struct
+import sys
+import threading
 import types
 
 ################################################################ NaN handling
@@ -59,35 +67,341 @@ def floatToJson(x):
     else:
         return x
 
+################################################################ compact binary encoding of JSON objects (used by toBytes/fromBytes)
+
+# A header, then one value. Each value is a one-byte tag followed by its payload, with little-endian lengths and numbers:
+#     N, T, F                           None, True, False
+#     i <int64>                         integer
+#     L <uint32 length> <digits>        integer that does not fit in 64 bits
+#     d <float64>                       floating point number
+#     s <uint32 length> <utf-8 bytes>   string, also appended to the string table
+#     r <uint32 index>                  string that appeared before, by its position in the string table
+#     b <uint32 length> <float64>*      list in which every item is a floating point number, as one raw block
+#     c <uint32 length> <uint32 number of keys> (<key> <column>)*
+#                                       list of dicts that all have the same keys, stored column by column; each column
+#                                       is a list, so that numeric fields (bin centers, moments) become raw blocks too
+#     l <uint32 length> <value>*        any other list
+#     m <uint32 length> (<key> <value>)*   dict
+
+BYTES_HEADER = "HGB\x01"
+
+def encodeBytes(obj):
+    """Encode a JSON object (dicts, lists, strings, numbers, booleans, and None) as a string of bytes."""
+    out = [BYTES_HEADER]
+    strings = {}
+
+    def encode(obj):
+        if obj is None:
+            out.append("N")
+        elif obj is True:
+            out.append("T")
+        elif obj is False:
+            out.append("F")
+        elif isinstance(obj, (int, long)):
+            if -2**63 <= obj < 2**63:
+                out.append("i" + struct.pack("<q", obj))
+            else:
+                digits = str(obj)
+                out.append("L" + struct.pack("<I", len(digits)) + digits)
+        elif isinstance(obj, float):
+            out.append("d" + struct.pack("<d", obj))
+        elif isinstance(obj, basestring):
+            if obj in strings:
+                out.append("r" + struct.pack("<I", strings[obj]))
+            else:
+                strings[obj] = len(strings)
+                data = obj.encode("utf-8")
+                out.append("s" + struct.pack("<I", len(data)) + data)
+        elif isinstance(obj, (list, tuple)):
+            keys = obj[0].keys() if len(obj) > 1 and isinstance(obj[0], dict) else None
+            if len(obj) > 0 and all(type(x) is float for x in obj):
+                out.append("b" + struct.pack("<I{}d".format(len(obj)), len(obj), *obj))
+            elif keys is not None and all(isinstance(x, dict) and len(x) == len(keys) and all(k in x for k in keys) for x in obj) and \
+                 any(all(type(x[k]) is float for x in obj) for k in keys):
+                out.append("c" + struct.pack("<II", len(obj), len(keys)))
+                for k in keys:
+                    encode(k)
+                    encode([x[k] for x in obj])
+            else:
+                out.append("l" + struct.pack("<I", len(obj)))
+                for x in obj:
+                    encode(x)
+        elif isinstance(obj, dict):
+            out.append("m" + struct.pack("<I", len(obj)))
+            for k, v in obj.items():
+                encode(k)
+                encode(v)
+        else:
+            raise TypeError("cannot encode {} as bytes".format(repr(obj)))
+
+    encode(obj)
+    return "".join(out)
+
+def decodeBytes(data):
+    """Decode a string of bytes made by encodeBytes back into a JSON object (strings are returned as unicode)."""
+    data = buffer(data)
+    if data[:len(BYTES_HEADER)] != BYTES_HEADER:
+        raise ValueError("not a histogrammar byte string (wrong header)")
+    strings = []
+
+    def unpack(format, position):
+        try:
+            return struct.unpack_from(format, data, position)
+        except struct.error:
+            raise ValueError("truncated histogrammar byte string at position {}".format(position))
+
+    def decode(position):
+        start = position
+        tag = data[position:position + 1]
+        position += 1
+        if tag == "N":
+            return None, position
+        elif tag == "T":
+            return True, position
+        elif tag == "F":
+            return False, position
+        elif tag == "i":
+            return unpack("<q", position)[0], position + 8
+        elif tag == "d":
+            return unpack("<d", position)[0], position + 8
+        elif tag == "r":
+            index, = unpack("<I", position)
+            if index >= len(strings):
+                raise ValueError("string reference {} out of range at position {}".format(index, position))
+            return strings[index], position + 4
+        elif tag not in ("L", "s", "b", "c", "l", "m"):
+            raise ValueError("unrecognized tag {} at position {}".format(repr(tag), start))
+
+        length, = unpack("<I", position)
+        position += 4
+        if tag == "L" or tag == "s":
+            if position + length > len(data):
+                raise ValueError("truncated histogrammar byte string at position {}".format(position))
+            text = data[position:position + length]
+            if tag == "L":
+                return long(text), position + length
+            strings.append(text.decode("utf-8"))
+            return strings[-1], position + length
+        elif tag == "b":
+            return list(unpack("<{}d".format(length), position)), position + 8*length
+        elif tag == "c":
+            numKeys, = unpack("<I", position)
+            position += 4
+            out = [{} for i in xrange(length)]
+            for i in xrange(numKeys):
+                k, position = decode(position)
+                column, position = decode(position)
+                if not isinstance(column, list) or len(column) != length:
+                    raise ValueError("column {} does not have {} items at position {}".format(repr(k), length, start))
+                for x, v in zip(out, column):
+                    x[k] = v
+            return out, position
+        elif tag == "l":
+            out = []
+            for i in xrange(length):
+                x, position = decode(position)
+                out.append(x)
+            return out, position
+        else:
+            out = {}
+            for i in xrange(length):
+                k, position = decode(position)
+                out[k], position = decode(position)
+            return out, position
+
+    out, position = decode(len(BYTES_HEADER))
+    if position != len(data):
+        raise ValueError("{} unused bytes at the end of histogrammar byte string".format(len(data) - position))
+    return out
+
+################################################################ streaming JSON output (used by toJsonStream)
+
+class JsonObject(object):
+    """A JSON object given as an iterable of key, value pairs, so that writeJson can write it one pair at a time."""
+    def __init__(self, pairs):
+        self.pairs = pairs
+
+def jsonKey(key):
+    """The quoted JSON string that json.dumps writes for a dict key (non-string keys are converted the same way)."""
+    if isinstance(key, basestring):
+        return jsonlib.dumps(key)
+    else:
+        return jsonlib.dumps({key: 0})[1:-len(": 0}")]
+
+def writeJson(fileobj, obj):
+    """Write obj to fileobj as JSON without first building all of it in memory.
+
+    Dicts, lists, tuples, generators, and JsonObjects are written one item at a time and containers (anything with a
+    toJsonStreamFragment method) write their own fragments; everything else is written with json.dumps.
+    """
+    if hasattr(obj, "toJsonStreamFragment"):
+        obj.toJsonStreamFragment(fileobj)
+
+    elif isinstance(obj, (dict, JsonObject)):
+        fileobj.write("{")
+        for i, (k, v) in enumerate(obj.iteritems() if isinstance(obj, dict) else obj.pairs):
+            if i > 0:
+                fileobj.write(", ")
+            fileobj.write(jsonKey(k))
+            fileobj.write(": ")
+            writeJson(fileobj, v)
+        fileobj.write("}")
+
+    elif isinstance(obj, (list, tuple, types.GeneratorType)):
+        fileobj.write("[")
+        for i, x in enumerate(obj):
+            if i > 0:
+                fileobj.write(", ")
+            writeJson(fileobj, x)
+        fileobj.write("]")
+
+    else:
+        fileobj.write(jsonlib.dumps(obj))
+
 ################################################################ function tools
 
+def compileExpression(expression, varname="datum", attributes="__dict__", scope={}):
+    """Turn a string expression into a function of one datum.
+
+    Names in the expression resolve to entries in the datum's __dict__ (or other mapping named by attributes), then to
+    the datum itself (as varname), then to scope, this module's globals and the builtins, just as if the expression were
+    evaluated in that merged context. The lookups are generated as code once, so no context dictionary is built per datum.
+    """
+    compile(expression, "<string>", "eval")   # report syntax errors against the expression itself
+
+    def undefined(name):
+        raise NameError("name {!r} is not defined".format(name))
+
+    namespace = {"__empty": {}, "__undefined": undefined}
+    lines = ["def function(__datum):",
+             "    try:",
+             "        __attrs = __datum." + attributes,
+             "    except AttributeError:",
+             "        __attrs = __empty"]
+
+    nodes = [node for node in ast.walk(ast.parse(expression, mode="eval")) if isinstance(node, ast.Name)]
+    bound = set(node.id for node in nodes if not isinstance(node.ctx, ast.Load))   # comprehension variables, lambda arguments
+    for i, name in enumerate(sorted(set(node.id for node in nodes) - set(["None", "True", "False"]))):
+        if name == varname:
+            default = "__datum"
+        elif name in scope or name in globals() or hasattr(__builtin__, name):
+            default = "__default{}".format(i)
+            namespace[default] = scope[name] if name in scope else globals()[name] if name in globals() else getattr(__builtin__, name)
+        elif name in bound:
+            default = None
+        else:
+            default = "__undefined({!r})".format(name)
+
+        if default is None:
+            lines.append("    if {0!r} in __attrs: {0} = __attrs[{0!r}]".format(name))
+        else:
+            lines.append("    {0} = __attrs[{0!r}] if {0!r} in __attrs else {1}".format(name, default))
+
+    lines.append("    return (" + expression + "\n        )")
+    exec compile("\n".join(lines), "<string>", "exec") in namespace
+    return namespace["function"]
+
+class FillCache(threading.local):
+    """Results of functions evaluated on the datum (or batch) currently being filled, keyed on function identity.
+
+    Containers that fill many children with the same datum (Label, UntypedLabel, Index, Branch, Fraction and Stack) open a
+    pass around the fill, so that a quantity or selection shared by all of those children is evaluated once. Only calls
+    whose argument is that very datum object are memoized, and the cache is discarded when the outermost pass ends.
+    Each thread has its own cache.
+    """
+
+    def __init__(self):
+        self.datum = None
+        self.values = None
+
+    @contextlib.contextmanager
+    def filling(self, datum):
+        if self.values is not None:
+            yield   # already inside a pass
+        else:
+            self.datum = datum
+            self.values = {}
+            try:
+                yield
+            finally:
+                self.datum = None
+                self.values = None
+
+    def call(self, fcn, datum, evaluate=None):
+        # fcn(datum), or evaluate(datum) memoized under the key fcn if evaluate is given
+        if evaluate is None:
+            evaluate = fcn
+        values = self.values
+        if values is None or datum is not self.datum:
+            return evaluate(datum)
+        try:
+            return values[fcn]
+        except KeyError:
+            out = values[fcn] = evaluate(datum)
+            return out
+
+fillCache = FillCache()
+
 class Fcn(object):
     def __init__(self, fcn, varname="datum"):
         if isinstance(fcn, basestring):
-            c = compile(fcn, "<string>", "eval")
-            def function(datum):
-                context = dict(globals(), **{varname: datum})
-                try:
-                    context.update(datum.__dict__)
-                except AttributeError:
-                    pass
-                return eval(c, context)
-            fcn = function
+            self.expression = fcn
+            self.varname = varname
+            fcn = compileExpression(fcn, varname)
 
         if not isinstance(fcn, types.FunctionType):
             raise TypeError("quantity or selection function must be a function or string expression")
         self.fcn = fcn
 
     def __call__(self, *args, **kwds):
-        return self.fcn(*args, **kwds)
+        if fillCache.values is None or len(args) != 1 or len(kwds) > 0:
+            return self.fcn(*args, **kwds)
+        return fillCache.call(self.fcn, args[0])
+
+    @property
+    def vectorized(self):
+        # for string expressions, the same expression evaluated on a whole array or Columns batch at once (None otherwise);
+        # it raises TypeError if a referenced column is not 1D and numeric or if the expression calls a builtin other than
+        # abs or pow (len, sum, max... would act on the whole column), so that those batches are evaluated per datum
+        if not hasattr(self, "expression"):
+            return None
+        if "_vectorized" not in self.__dict__:
+            import numpy
+            names = set(node.id for node in ast.walk(ast.parse(self.expression, mode="eval")) if isinstance(node, ast.Name))
+            scope = dict((name, notVectorized) for name in names if hasattr(__builtin__, name) and name not in ("abs", "pow", "None", "True", "False"))
+            scope.update({"math": NumpyMath(), "abs": numpy.absolute})
+            function = compileExpression(self.expression, self.varname, "_columns", scope)
+            varname = self.varname
+
+            def vectorized(data):
+                if isinstance(data, Columns):
+                    arrays = [data[name] for name in names if name in data._columns] + ([data] if varname in names and varname not in data._columns else [])
+                else:
+                    arrays = [data]
+                if not all(isinstance(x, numpy.ndarray) and x.ndim == 1 and x.dtype.kind in "biufc" for x in arrays):
+                    raise TypeError("only 1D numeric columns are evaluated as a whole")
+                return function(data)
+
+            self._vectorized = vectorized
+        return self._vectorized
 
     def __reduce__(self):
+        if hasattr(self, "expression"):
+            return (self.__class__, (self.expression, self.varname))
         refs = {n: self.fcn.func_globals[n] for n in self.fcn.func_code.co_names if n in self.fcn.func_globals}
         return (deserializeFcn, (self.__class__, marshal.dumps(self.fcn.func_code), self.fcn.func_name, self.fcn.func_defaults, self.fcn.func_closure, refs))
 
     def __repr__(self):
         return "Fcn({})".format(self.fcn)
 
+class VectorizedFcn(Fcn):
+    @property
+    def vectorized(self):
+        return self.fcn
+
+    def __repr__(self):
+        return "VectorizedFcn({})".format(self.fcn)
+
 class CachedFcn(Fcn):
     def __call__(self, *args, **kwds):
         if hasattr(self, "lastArgs") and hasattr(self, "lastKwds") and args == self.lastArgs and kwds == self.lastKwds:
@@ -115,6 +429,22 @@ def serializable(fcn):
     else:
         return Fcn(fcn)
 
+def vectorize(fcn):
+    """Mark a function as accepting a whole NumPy array (or Columns) and returning one value per datum.
+
+    Batch fills call it once per batch instead of once per datum; if it does not return an array with one value per
+    datum, it is called on each datum instead.
+    """
+    if isinstance(fcn, VectorizedFcn):
+        return fcn
+    elif isinstance(fcn, Fcn):
+        return VectorizedFcn(fcn.fcn)
+    else:
+        return VectorizedFcn(fcn)
+
+def notVectorized(*args, **kwds):
+    raise TypeError("builtin function does not act on each datum of a batch")
+
 def cache(fcn):
     if isinstance(fcn, CachedFcn):
         return fcn
@@ -123,6 +453,213 @@ def cache(fcn):
     else:
         return CachedFcn(fcn)
 
+################################################################ array tools (NumPy is only imported when these are used)
+
+def isArray(x):
+    numpy = sys.modules.get("numpy")
+    return numpy is not None and isinstance(x, numpy.ndarray)
+
+def arrayWeights(weights, length):
+    import numpy
+    if weights is None:
+        return numpy.ones(length, dtype=numpy.float64)
+    else:
+        weights = numpy.asarray(weights, dtype=numpy.float64)
+        if weights.shape == ():
+            return numpy.repeat(weights, length)
+        elif weights.shape != (length,):
+            raise ValueError("weights must be a scalar or have the same length as the data ({} vs {})".format(weights.shape, length))
+        return weights
+
+class NumpyMath(object):
+    """Stands in for the math module when an expression is evaluated on whole columns: math.f is numpy's ufunc f."""
+
+    renamed = {"asin": "arcsin", "acos": "arccos", "atan": "arctan", "atan2": "arctan2", "asinh": "arcsinh", "acosh": "arccosh", "atanh": "arctanh", "pow": "power"}
+
+    def __getattr__(self, name):
+        import numpy
+        return getattr(numpy, self.renamed.get(name, name), None) or getattr(math, name)
+
+def rowValue(x):
+    # NumPy scalars become Python numbers and strings, so that a Row behaves like the object it came from
+    numpy = sys.modules.get("numpy")
+    if numpy is not None and isinstance(x, numpy.generic):
+        return x.item()
+    else:
+        return x
+
+class Row(object):
+    """One datum of a Columns batch, with the column values as attributes."""
+
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+    def __repr__(self):
+        return "Row({})".format(", ".join("{}={!r}".format(k, v) for k, v in sorted(self.__dict__.items())))
+
+class Columns(object):
+    """A batch of data stored column by column, from a dict of equal-length arrays or a pandas DataFrame.
+
+    Pass it to fillBatch: string-expression quantities and selections over 1D numeric columns are evaluated on whole
+    columns (names are column names and math functions are NumPy ufuncs), functions can read columns as attributes, and
+    anything that cannot be vectorized is evaluated on one Row at a time.
+    """
+
+    def __init__(self, columns):
+        import numpy
+        pandas = sys.modules.get("pandas")
+        if pandas is not None and isinstance(columns, pandas.DataFrame):
+            columns = dict((name, columns[name].values) for name in columns.columns)
+        self._columns = dict((name, numpy.asarray(column)) for name, column in columns.items())
+
+        lengths = set(len(column) for column in self._columns.values())
+        if len(lengths) > 1:
+            raise ValueError("columns must all have the same length ({})".format(", ".join(map(str, sorted(lengths)))))
+        self._length = lengths.pop() if len(lengths) == 1 else 0
+
+    def __len__(self):
+        return self._length
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["_columns"][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, index):
+        if isinstance(index, basestring):
+            return self._columns[index]
+        elif isinstance(index, (int, long)):
+            return Row(dict((name, rowValue(column[index])) for name, column in self._columns.items()))
+        else:
+            return Columns(dict((name, column[index]) for name, column in self._columns.items()))
+
+    def __iter__(self):
+        for i in xrange(self._length):
+            yield self[i]
+
+    def __repr__(self):
+        return "Columns({}, length={})".format(", ".join(sorted(map(str, self._columns))), self._length)
+
+def arrayEvaluate(fcn, data, dtype=None):
+    # functions are called on each datum, except string expressions and functions marked by vectorize, which are first
+    # tried on the whole array or Columns; that result is only used if it is an array with one value per datum
+    import numpy
+    if not isinstance(data, (numpy.ndarray, Columns)):
+        return numpy.array([fcn(x) for x in data], dtype=dtype)
+
+    def evaluate(data):
+        vectorized = getattr(fcn, "vectorized", None)
+        if vectorized is not None:
+            try:
+                # domain errors and division by zero raise per datum, so they send the batch to the per-datum path
+                with numpy.errstate(all="ignore", divide="raise", invalid="raise"):
+                    out = vectorized(data)
+            except Exception:
+                pass
+            else:
+                if isinstance(out, numpy.ndarray) and out.ndim > 0 and out.shape[0] == len(data):
+                    return out
+        if numbaJit.enabled and dtype is None and isinstance(data, numpy.ndarray):
+            out = numbaJit.evaluate(fcn, data)
+            if out is not None:
+                return out
+        return numpy.array([fcn(x) for x in data], dtype=dtype)
+
+    return fillCache.call((fcn, dtype), data, evaluate)
+
+def arrayTake(data, indexes):
+    import numpy
+    if isinstance(data, (numpy.ndarray, Columns)):
+        return data[indexes]
+    else:
+        return [data[i] for i in indexes]
+
+def arrayGroups(inverse, size):
+    # positions of each value 0...size-1 in inverse, keeping their original order
+    import numpy
+    order = numpy.argsort(inverse, kind="mergesort")
+    return numpy.split(order, numpy.searchsorted(inverse[order], numpy.arange(1, size)))
+
+################################################################ optional Numba JIT (Numba is only imported when enabled)
+
+class NumbaJit(object):
+    """Opt-in engine that compiles the per-datum loops of batch fills with Numba.
+
+    When enabled, functions that cannot be applied to a whole NumPy array at once are compiled for the array's dtype
+    and called in a compiled loop, and a Bin of Counts is filled in a single compiled pass. Functions that Numba cannot
+    compile (or arrays that are not 1D and numeric) are evaluated in Python as before.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._histogram = None
+
+    def enable(self, enabled=True):
+        """Turn the engine on or off; returns whether it is on, which is False if Numba is not installed."""
+        if enabled:
+            try:
+                import numba
+            except ImportError:
+                enabled = False
+        self.enabled = enabled
+        return enabled
+
+    def evaluate(self, fcn, data):
+        """Return fcn applied to each element of data as a float64 array, or None if it cannot be compiled."""
+        import numba
+        import numpy
+        if not isinstance(fcn, Fcn) or data.ndim != 1 or data.dtype.kind not in "biuf":
+            return None
+
+        loops = fcn.__dict__.setdefault("_jitted", {})
+        loop = loops.get(data.dtype)
+        if loop is None and data.dtype not in loops:
+            function = numba.njit(fcn.fcn)
+            @numba.njit
+            def loop(data, out):
+                for i in range(data.shape[0]):
+                    out[i] = function(data[i])
+            loops[data.dtype] = loop
+        if loop is None:
+            return None
+
+        out = numpy.empty(len(data), dtype=numpy.float64)
+        try:
+            loop(data, out)
+        except Exception:
+            loops[data.dtype] = None   # not compilable for this dtype (or it raised: let Python raise it again)
+            return None
+        return out
+
+    def histogram(self, q, w, low, high, num):
+        """Sums of weights in each of num bins between low and high, followed by underflow, overflow, and nanflow."""
+        import numba
+        import numpy
+        if self._histogram is None:
+            @numba.njit
+            def histogram(q, w, low, high, num, out):
+                for i in range(q.shape[0]):
+                    x = q[i]
+                    if x != x:
+                        out[num + 2] += w[i]
+                    elif x < low:
+                        out[num] += w[i]
+                    elif x >= high:
+                        out[num + 1] += w[i]
+                    else:
+                        b = int(math.floor(num * (x - low) / (high - low)))
+                        if b > num - 1:
+                            b = num - 1
+                        out[b] += w[i]
+            self._histogram = histogram
+
+        out = numpy.zeros(num + 3, dtype=numpy.float64)
+        self._histogram(q, w, float(low), float(high), num, out)
+        return out
+
+numbaJit = NumbaJit()
+
 ################################################################ 1D clustering algorithm (used by AdaptivelyBin)
 
 @functools.total_ordering
@@ -142,33 +679,161 @@ class Clustering1D(object):
         self.max = max
         self.entries = entries
 
+        self._pairHeap = None
         self._mergeClusters()
 
+    def __getstate__(self):
+        # the heap of _closestPair is rebuilt when needed
+        out = dict(self.__dict__)
+        out["_pairHeap"] = None
+        return out
+
+    def _distance(self, x1, v1, x2, v2):
+        return (self.tailDetail  * (x2 - x1)/(self.max - self.min) +
+         (1.0 - self.tailDetail) * (v1.entries + v2.entries)/self.entries)
+
+    def _scanPairs(self):
+        smallestDistance = None
+        for index in xrange(len(self.values) - 1):
+            x1, v1 = self.values[index]
+            x2, v2 = self.values[index + 1]
+
+            distanceMetric = (self.tailDetail  * (x2 - x1)/(self.max - self.min) +
+                       (1.0 - self.tailDetail) * (v1.entries + v2.entries)/self.entries)
+
+            if smallestDistance is None or distanceMetric < smallestDistance:
+                smallestDistance = distanceMetric
+                lowIndex = index
+        return lowIndex
+
+    def _pairIndex(self, x1, v1, v2):
+        # position of the adjacent pair (v1, v2) in values, or None if it no longer exists
+        index = bisect.bisect_left(self.values, (x1, LessThanEverything()))
+        while index < len(self.values) - 1 and self.values[index][0] == x1:
+            if self.values[index][1] is v1:
+                return index if self.values[index + 1][1] is v2 else None
+            index += 1
+        return None
+
+    def _pushPair(self, index):
+        if self._pairHeap is not None and 0 <= index < len(self.values) - 1:
+            (x1, v1), (x2, v2) = self.values[index], self.values[index + 1]
+            a0, b0 = self._pairScale
+            self._pairCounter += 1
+            heapq.heappush(self._pairHeap, (a0 * (x2 - x1) + b0 * (v1.entries + v2.entries), self._pairCounter, x1, v1, v2))
+
+    def _closestPair(self):
+        # Index of the closest adjacent pair (leftmost on ties), the same as _scanPairs, from a heap of pairs that is
+        # kept between fills. Its keys use the normalization a0 = tailDetail/(max - min), b0 = (1 - tailDetail)/entries
+        # of when it was built; since the gap between two clusters never changes and their entries only grow, every
+        # pair's current distance is at least c times its key, with c = min(a/a0, b/b0) for the current a and b. Pairs
+        # are popped in key order until that bound exceeds the smallest distance seen, so only the few pairs near the
+        # minimum are examined. Pairs that no longer exist are dropped when popped; the heap is rebuilt when the
+        # normalization has drifted (c < 0.9) or it is mostly stale.
+        n = len(self.values)
+        if n <= 48:
+            return self._scanPairs()   # faster for a few clusters
+        try:
+            a = self.tailDetail / (self.max - self.min)
+            b = (1.0 - self.tailDetail) / self.entries
+        except ZeroDivisionError:
+            return self._scanPairs()
+        if not (0.0 <= a < float("inf") and 0.0 <= b < float("inf")):
+            return self._scanPairs()
+
+        if self._pairHeap is not None and self._pairHeapOf is self.values and len(self._pairHeap) <= 3 * n:
+            a0, b0 = self._pairScale
+            c = min(a / a0 if a0 > 0.0 else 1.0, b / b0 if b0 > 0.0 else 1.0)
+        else:
+            c = 0.0
+        if c < 0.9:
+            self._pairScale = a, b
+            self._pairHeapOf = self.values
+            self._pairHeap = []
+            self._pairCounter = 0
+            for index in xrange(n - 1):
+                self._pushPair(index)
+            c = 1.0
+
+        heap = self._pairHeap
+        bound = c * (1.0 - 1e-9)   # allowance for rounding in the keys
+        smallestDistance = None
+        popped = []
+        seen = set()
+        while len(heap) > 0 and (smallestDistance is None or heap[0][0] * bound <= smallestDistance):
+            pair = heapq.heappop(heap)
+            index = self._pairIndex(pair[2], pair[3], pair[4])
+            if index is None or id(pair[3]) in seen:
+                continue
+            seen.add(id(pair[3]))
+            popped.append(pair)
+
+            x1, v1 = self.values[index]
+            x2, v2 = self.values[index + 1]
+            distanceMetric = self._distance(x1, v1, x2, v2)
+            if smallestDistance is None or distanceMetric < smallestDistance or (distanceMetric == smallestDistance and index < lowIndex):
+                smallestDistance = distanceMetric
+                lowIndex = index
+
+        for pair in popped:
+            heapq.heappush(heap, pair)
+        if smallestDistance is None:
+            return self._scanPairs()
+        return lowIndex
+
     def _mergeClusters(self):
-        while len(self.values) > self.num:
-            smallestDistance = None
-            nearestNeighbors = None
-            lowIndex = None
-
-            for index in xrange(len(self.values) - 1):
-                x1, v1 = self.values[index]
-                x2, v2 = self.values[index + 1]
-
-                distanceMetric = (self.tailDetail  * (x2 - x1)/(self.max - self.min) +
-                           (1.0 - self.tailDetail) * (v1.entries + v2.entries)/self.entries)
-
-                if smallestDistance is None or distanceMetric < smallestDistance:
-                    smallestDistance = distanceMetric
-                    nearestNeighbors = (x1, v1), (x2, v2)
-                    lowIndex = index
-
-            (x1, v1), (x2, v2) = nearestNeighbors
-            replacement = (x1 * v1.entries + x2 * v2.entries) / (v1.entries + v2.entries), v1 + v2
-
-            del self.values[lowIndex]
-            del self.values[lowIndex]
-            self.values.insert(lowIndex, replacement)
-            
+        # Always merges the closest adjacent pair (leftmost on ties), as a linear scan would. A single merge (the usual
+        # case when filling one datum at a time) is found through the heap of _closestPair, which lasts between fills;
+        # several merges (batches, merged clusterings) use a heap built per call: O(n + k log n) for k merges.
+        n = len(self.values)
+        if n <= self.num:
+            return
+
+        if n == self.num + 1:
+            lowIndex = self._closestPair()
+            (x1, v1), (x2, v2) = self.values[lowIndex], self.values[lowIndex + 1]
+            self.values[lowIndex:lowIndex + 2] = [((x1 * v1.entries + x2 * v2.entries) / (v1.entries + v2.entries), v1 + v2)]
+            self._pushPair(lowIndex - 1)
+            self._pushPair(lowIndex)
+            return
+
+        self._pairHeap = None
+        xs = [x for x, v in self.values]
+        vs = [v for x, v in self.values]
+        previous = range(-1, n - 1)
+        following = range(1, n + 1)
+        alive = [True] * n
+        version = [0] * n
+
+        heap = [(self._distance(xs[i], vs[i], xs[i + 1], vs[i + 1]), i, 0) for i in xrange(n - 1)]
+        heapq.heapify(heap)
+
+        size = n
+        while size > self.num:
+            distanceMetric, i, v = heapq.heappop(heap)
+            if not alive[i] or v != version[i] or following[i] == n:
+                continue
+
+            j = following[i]
+            xs[i] = (xs[i] * vs[i].entries + xs[j] * vs[j].entries) / (vs[i].entries + vs[j].entries)
+            vs[i] = vs[i] + vs[j]
+            alive[j] = False
+            following[i] = following[j]
+            if following[j] < n:
+                previous[following[j]] = i
+            size -= 1
+
+            version[i] += 1
+            if following[i] < n:
+                k = following[i]
+                heapq.heappush(heap, (self._distance(xs[i], vs[i], xs[k], vs[k]), i, version[i]))
+            k = previous[i]
+            if k >= 0:
+                version[k] += 1
+                heapq.heappush(heap, (self._distance(xs[k], vs[k], xs[i], vs[i]), k, version[k]))
+
+        self.values[:] = [(xs[i], vs[i]) for i in xrange(n) if alive[i]]
+
     def update(self, x, datum, weight):
         if weight > 0.0:
             index = bisect.bisect_left(self.values, (x, LessThanEverything()))
@@ -178,6 +843,8 @@ class Clustering1D(object):
                 v = self.value.zero()
                 v.fill(datum, weight)
                 self.values.insert(index, (x, v))
+                self._pushPair(index - 1)
+                self._pushPair(index)
                 self._mergeClusters()
 
         if math.isnan(self.min) or x < self.min:
@@ -187,6 +854,39 @@ class Clustering1D(object):
 
         self.entries += weight
 
+    def updateBatch(self, xs, data, weights):
+        # fills every new value before merging clusters once; unlike a sequence of update calls, the distance
+        # normalization includes the whole batch
+        import numpy
+        positive = numpy.nonzero(weights > 0.0)[0]
+        centers, inverse = numpy.unique(xs[positive], return_inverse=True)
+
+        values = []
+        index = 0
+        for x, group in zip(centers.tolist(), arrayGroups(inverse, len(centers))):
+            subset = positive[group]
+            while index < len(self.values) and self.values[index][0] < x:
+                values.append(self.values[index])
+                index += 1
+            if index < len(self.values) and self.values[index][0] == x:
+                self.values[index][1].fillBatch(arrayTake(data, subset), weights[subset])
+                values.append(self.values[index])
+                index += 1
+            else:
+                v = self.value.zero()
+                v.fillBatch(arrayTake(data, subset), weights[subset])
+                values.append((x, v))
+        values.extend(self.values[index:])
+        self.values[:] = values
+
+        if len(xs) > 0:
+            self.min = minplus(self.min, float(xs.min()))
+            self.max = maxplus(self.max, float(xs.max()))
+        self.entries += float(weights.sum())
+
+        self._pairHeap = None
+        self._mergeClusters()
+
     def merge(self, other):
         bins = {}
 
@@ -201,6 +901,23 @@ class Clustering1D(object):
 
         return Clustering1D(self.num, self.tailDetail, self.value, sorted(bins.items()), minplus(self.min, other.min), maxplus(self.max, other.max), self.entries + other.entries)
 
+    def mergeInPlace(self, other):
+        # like merge, but adds other's clusters into this one's (which are updated in place, not copied)
+        bins = dict(self.values)
+
+        for x, v in other.values:
+            if x in bins:
+                bins[x] += v
+            else:
+                bins[x] = v.copy()
+
+        self.values[:] = sorted(bins.items())
+        self.min = minplus(self.min, other.min)
+        self.max = maxplus(self.max, other.max)
+        self.entries += other.entries
+        self._pairHeap = None
+        self._mergeClusters()
+
     def __eq__(self, other):
         return self.num == other.num and exact(self.tailDetail, other.tailDetail) and self.values == other.values and exact(self.min, other.min) and exact(self.max, other.max) and exact(self.entries, other.entries)
 
@@ -210,142 +927,151 @@ class Clustering1D(object):
 ################################################################ interpretation of central bins as a distribution
 
 class CentralBinsDistribution(object):
-    def pdf(self, *xs):
-        if len(xs) == 0:
-            return self.pdfTimesEntries(xs[0]) / self.entries
-        else:
-            return [x / self.entries for x in self.pdfTimesEntries(*xs)]
-
-    def cdf(self, *xs):
-        if len(xs) == 0:
-            return self.cdfTimesEntries(xs[0]) / self.entries
-        else:
-            return [x / self.entries for x in self.cdfTimesEntries(*xs)]
-
-    def qf(self, *xs):
-        if len(xs) == 0:
-            return self.qfTimesEntries(xs[0]) * self.entries
-        else:
-            return [x * self.entries for x in self.qfTimesEntries(*xs)]
-
-    def pdfTimesEntries(self, x, *xs):
-        xs = [x] + list(xs)
-
+    # Bin i covers [edges[i], edges[i + 1]): the edges are min, the midpoints between centers, and max. These and the
+    # cumulative entries are cached until the container is filled (which sets _distribution to None) or replaced.
+
+    def _distributionArrays(self):
+        if getattr(self, "_distribution", None) is None:
+            centers = [c for c, v in self.bins]
+            midpoints = [(c1 + c2)/2.0 for c1, c2 in zip(centers[:-1], centers[1:])]
+            edges = [self.min] + midpoints + [self.max]
+            entries = [v.entries for c, v in self.bins]
+            cumulative = [0.0]
+            for e in entries:
+                cumulative.append(cumulative[-1] + e)
+            self._distribution = {"midpoints": midpoints, "edges": edges, "entries": entries, "cumulative": cumulative}
+        return self._distribution
+
+    def _distributionNumpy(self):
+        import numpy
+        arrays = self._distributionArrays()
+        if "numpy" not in arrays:
+            arrays["numpy"] = {k: numpy.array(v, dtype=numpy.float64) for k, v in arrays.items()}
+        return arrays["numpy"]
+
+    def _distributionQuery(self, scalar, vectorized, empty, single, xs):
         if len(self.bins) == 0 or math.isnan(self.min) or math.isnan(self.max):
-            out = [0.0] * len(xs)
-
+            evaluate = lambda x: empty
         elif len(self.bins) == 1:
-            out = [float("inf") if x == bins[0][0] else 0.0 for x in xs]
-
+            evaluate = single
         else:
-            out = [0.0] * len(xs)
-
-            left = self.min
-            for i in xrange(len(self.bins)):
-                if i < len(self.bins) - 1:
-                    right = (self.bins[i][0] + self.bins[i + 1][0]) / 2.0
-                else:
-                    right = self.max
-
-                entries = self.bins[i][1].entries
+            evaluate = scalar
 
-                for j, x in enumerate(xs):
-                    if left <= x and x < right:
-                        out[j] = entries / (right - left)
+        if len(xs) == 1 and isArray(xs[0]):
+            import numpy
+            x = numpy.asarray(xs[0], dtype=numpy.float64)
+            if evaluate is scalar:
+                return vectorized(x, self._distributionNumpy())
+            else:
+                return numpy.array([evaluate(xi) for xi in x.flat], dtype=numpy.float64).reshape(x.shape)
 
-                left = right
-            
+        out = [evaluate(x) for x in xs]
         if len(xs) == 1:
             return out[0]
         else:
             return out
 
-    def cdfTimesEntries(self, x, *xs):
-        xs = [x] + list(xs)
-
-        if len(self.bins) == 0 or math.isnan(self.min) or math.isnan(self.max):
-            out = [0.0] * len(xs)
-
-        elif len(self.bins) == 1:
-            out = []
-            for x in xs:
-                if x < self.bins[0][0]:
-                    out.append(0.0)
-                elif x == self.bins[0][0]:
-                    out.append(self.bins[0][1].entries / 2.0)
-                else:
-                    out.append(self.bins[0][1].entries)
-
+    def pdf(self, *xs):
+        if len(xs) == 1:
+            return self.pdfTimesEntries(xs[0]) / self.entries
         else:
-            out = [0.0] * len(xs)
-
-            left = self.min
-            cumulative = 0.0
-            for i in xrange(len(self.bins)):
-                if i < len(self.bins) - 1:
-                    right = (self.bins[i][0] + self.bins[i + 1][0]) / 2.0
-                else:
-                    right = self.max
-
-                entries = self.bins[i][1].entries
-
-                for j, x in enumerate(xs):
-                    if left <= x and x < right:
-                        out[j] = cumulative + entries * (x - left)/(right - left)
-
-                left = right
-                cumulative += entries
-
-            for j, x in enumerate(xs):
-                if x >= self.max:
-                    out[j] = cumulative
+            return [x / self.entries for x in self.pdfTimesEntries(*xs)]
 
+    def cdf(self, *xs):
         if len(xs) == 1:
-            return out[0]
+            return self.cdfTimesEntries(xs[0]) / self.entries
         else:
-            return out
-
-    def qfTimesEntries(self, y, *ys):
-        ys = [y] + list(ys)
-
-        if len(self.bins) == 0 or math.isnan(self.min) or math.isnan(self.max):
-            out = [float("nan")] * len(ys)
-
-        elif len(self.bins) == 1:
-            out = [self.bins[0][0]] * len(ys)
+            return [x / self.entries for x in self.cdfTimesEntries(*xs)]
 
+    def qf(self, *ys):
+        if len(ys) == 1:
+            return self.qfTimesEntries(ys[0] * self.entries)
         else:
-            out = [self.min] * len(ys)
-
-            left = self.min
-            cumulative = 0.0
-            for i in xrange(len(self.bins)):
-                if i < len(self.bins) - 1:
-                    right = (self.bins[i][0] + self.bins[i + 1][0]) / 2.0
-                else:
-                    right = self.max
+            return self.qfTimesEntries(*[y * self.entries for y in ys])
 
-                entries = self.bins[i][1].entries
+    def pdfTimesEntries(self, x, *xs):
+        def scalar(x):
+            arrays = self._distributionArrays()
+            edges = arrays["edges"]
+            i = bisect.bisect_right(arrays["midpoints"], x)
+            if edges[i] <= x and x < edges[i + 1]:
+                return arrays["entries"][i] / (edges[i + 1] - edges[i])
+            else:
+                return 0.0
+
+        def vectorized(x, arrays):
+            import numpy
+            i = numpy.searchsorted(arrays["midpoints"], x, side="right")
+            left, right = arrays["edges"][i], arrays["edges"][i + 1]
+            with numpy.errstate(all="ignore"):
+                return numpy.where((left <= x) & (x < right), arrays["entries"][i] / (right - left), 0.0)
+
+        def single(x):
+            if x == self.bins[0][0]:
+                return float("inf")
+            else:
+                return 0.0
 
-                low = cumulative
-                high = cumulative + entries
+        return self._distributionQuery(scalar, vectorized, 0.0, single, (x,) + xs)
 
-                for j, y in enumerate(ys):
-                    if low <= y and y < high:
-                        out[j] = left + (right - left)*(y - low)/(high - low)
+    def cdfTimesEntries(self, x, *xs):
+        def scalar(x):
+            arrays = self._distributionArrays()
+            edges, cumulative = arrays["edges"], arrays["cumulative"]
+            if x >= self.max:
+                return cumulative[-1]
+            i = bisect.bisect_right(arrays["midpoints"], x)
+            if edges[i] <= x and x < edges[i + 1]:
+                return cumulative[i] + arrays["entries"][i] * (x - edges[i])/(edges[i + 1] - edges[i])
+            else:
+                return 0.0
+
+        def vectorized(x, arrays):
+            import numpy
+            i = numpy.searchsorted(arrays["midpoints"], x, side="right")
+            left, right = arrays["edges"][i], arrays["edges"][i + 1]
+            with numpy.errstate(all="ignore"):
+                out = numpy.where((left <= x) & (x < right), arrays["cumulative"][i] + arrays["entries"][i] * (x - left)/(right - left), 0.0)
+                out[x >= self.max] = arrays["cumulative"][-1]
+            return out
 
-                left = right
-                cumulative += entries
+        def single(x):
+            if x < self.bins[0][0]:
+                return 0.0
+            elif x == self.bins[0][0]:
+                return self.bins[0][1].entries / 2.0
+            else:
+                return self.bins[0][1].entries
 
-            for j, y in enumerate(ys):
-                if y >= cumulative:
-                    out[j] = self.max
+        return self._distributionQuery(scalar, vectorized, 0.0, single, (x,) + xs)
 
-        if len(ys) == 1:
-            return out[0]
-        else:
+    def qfTimesEntries(self, y, *ys):
+        def scalar(y):
+            arrays = self._distributionArrays()
+            edges, cumulative = arrays["edges"], arrays["cumulative"]
+            if y >= cumulative[-1]:
+                return self.max
+            i = bisect.bisect_right(cumulative, y) - 1
+            if i >= 0 and cumulative[i] <= y and y < cumulative[i + 1]:
+                return edges[i] + (edges[i + 1] - edges[i])*(y - cumulative[i])/(cumulative[i + 1] - cumulative[i])
+            else:
+                return self.min
+
+        def vectorized(y, arrays):
+            import numpy
+            edges, cumulative = arrays["edges"], arrays["cumulative"]
+            i = numpy.clip(numpy.searchsorted(cumulative, y, side="right") - 1, 0, len(self.bins) - 1)
+            low, high = cumulative[i], cumulative[i + 1]
+            with numpy.errstate(all="ignore"):
+                out = numpy.where((low <= y) & (y < high), edges[i] + (edges[i + 1] - edges[i])*(y - low)/(high - low), self.min)
+                out[y >= cumulative[-1]] = self.max
             return out
 
+        def single(y):
+            return self.bins[0][0]
+
+        return self._distributionQuery(scalar, vectorized, float("nan"), single, (y,) + ys)
+
 class CentrallyBinMethods(object):
     @property
     def centersSet(self): return set(self.centers)
@@ -14,11 +14,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import math
+import StringIO
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from histogrammar import *
 from histogrammar.histogram import Histogram
+import histogrammar.decoder
+import histogrammar.kernel
+import histogrammar.parallel
 
 class TestEverything(unittest.TestCase):
     simple = [3.4, 2.2, -1.8, 0.0, 7.3, -4.7, 1.6, 0.0, -3.0, -1.7]
@@ -93,6 +103,10 @@ class TestEverything(unittest.TestCase):
 
     def checkJson(self, x):
         self.assertEqual(x.toJson(), Factory.fromJson(x.toJson()).toJson())
+        self.assertEqual(x.toJson(), Factory.fromBytes(x.toBytes()).toJson())
+        stream = StringIO.StringIO()
+        x.toJsonStream(stream)
+        self.assertEqual(Factory.fromJson(x.toJson()).toJson(), Factory.fromJson(stream.getvalue()).toJson())
 
     ################################################################ Count
 
@@ -231,6 +245,20 @@ class TestEverything(unittest.TestCase):
 
             self.checkJson(leftSumming)
 
+    def testStringFunctionSemantics(self):
+        one = self.struct[0]
+        self.assertEqual(Fcn("datum.int + int")(one), -4)
+        self.assertEqual(Fcn("x.string + string", "x")(one), "oneone")
+        self.assertEqual(Fcn("math.sqrt(abs(int))")(one), math.sqrt(2))
+        self.assertEqual(Fcn("sum(v for v in [int, double])")(one), -2 + 3.4)
+        self.assertEqual(Fcn("[datum * 2 for x in [1]]")(3), [6])
+        self.assertRaises(NameError, lambda: Fcn("nonexistent")(one))
+
+        import pickle
+        summing = pickle.loads(pickle.dumps(Sum("double * 2", "int")))
+        for _ in self.struct: summing.fill(_)
+        self.assertAlmostEqual(summing.sum, sum(_.double * 2 * _.int for _ in self.struct if _.int > 0))
+
     ################################################################ Average
 
     def testAverage(self):
@@ -569,6 +597,89 @@ class TestEverything(unittest.TestCase):
         self.checkJson(one)
         self.checkJson(two)
 
+    def testHistogramStorage(self):
+        one = Histogram(5, -3.0, 7.0, lambda x: x)
+        for _ in self.simple: one.fill(_)
+        self.assertEqual(len(one.contents), 5)
+        self.assertEqual(one.values[0], Count.ed(3.0))
+        self.assertEqual(one.values[-1].name, "Count")
+
+        one.values[4].fill(None, 2.5)
+        self.assertEqual(one.numericalValues, [3.0, 2.0, 2.0, 1.0, 2.5])
+
+        two = one + one.copy()
+        self.assertEqual(two.numericalValues, [6.0, 4.0, 4.0, 2.0, 5.0])
+        self.assertEqual(one.zero().numericalValues, [0.0] * 5)
+
+        asBin = Factory.fromJson(one.toJson())
+        self.assertEqual(asBin.numericalValues, one.numericalValues)
+        self.assertEqual(asBin.toJson(), one.toJson())
+
+    def testProfileStorage(self):
+        for value, fields in (Average(lambda x: x.double), ["entries", "mean"]), (Deviate(lambda x: x.double), ["entries", "mean", "variance"]):
+            one = Bin(5, 0.0, 10.0, lambda x: x.int, value=value)
+            self.assertEqual(len(one.valuesEntries), 5)
+            self.assertEqual(one.values[0].name, value.name)
+
+            expected = [value.zero() for i in xrange(5)]
+            for _ in self.struct:
+                one.fill(_)
+                if 0 <= _.int < 10: expected[_.int // 2].fill(_)
+            for v, e in zip(one.values, expected):
+                for field in fields:
+                    self.assertEqual(getattr(v, field), getattr(e, field))
+
+            self.checkJson(one)
+            asBin = Factory.fromJson(one.toJson())
+            self.assertEqual(type(asBin), type(one))
+
+            two = one + one
+            for v, e in zip(two.values, expected):
+                if e.entries == 0.0:
+                    self.assertEqual(v.entries, 0.0)
+                    continue
+                for field in fields:
+                    self.assertAlmostEqual(getattr(v, field), getattr(e + e, field))
+            self.assertEqual(one.zero().values[0].entries, 0.0)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def testProfileArray(self):
+        weights = numpy.array([1.0, 2.0, 0.0, -1.0, 3.0, 1.0, 1.0, 2.0, 0.0, 1.0])
+        for value, fields in (Average(lambda x: x.double, lambda x: x.bool), ["entries", "mean"]), (Deviate(lambda x: x.double, lambda x: x.bool), ["entries", "mean", "variance"]):
+            one = Bin(5, 0.0, 10.0, lambda x: x.int, value=value)
+            for _, w in zip(self.struct, weights): one.fill(_, w)
+            two = Bin(5, 0.0, 10.0, lambda x: x.int, value=value)
+            two.fillBatch(self.struct[:4], weights[:4])
+            two.fillBatch(self.struct[4:], weights[4:])
+            self.assertEqual(two.entries, one.entries)
+            for v, e in zip(two.values, one.values):
+                for field in fields:
+                    self.assertAlmostEqual(getattr(v, field), getattr(e, field))
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def testHistogramArray(self):
+        one = Histogram(5, -3.0, 7.0, lambda x: x)
+        one.fillArray(numpy.array(self.simple + [float("nan")]))
+        self.assertEqual(one.numericalValues, [3.0, 2.0, 2.0, 1.0, 0.0])
+        self.assertEqual(one.underflow.entries, 1.0)
+        self.assertEqual(one.overflow.entries, 1.0)
+        self.assertEqual(one.nanflow.entries, 1.0)
+        self.assertEqual(one.entries, 11.0)
+
+        two = Histogram(5, -3.0, 7.0, lambda x: x.double, lambda x: x.int)
+        two.fillArray(self.struct)
+        expected = Histogram(5, -3.0, 7.0, lambda x: x.double, lambda x: x.int)
+        for _ in self.struct: expected.fill(_)
+        self.assertEqual(two.toJson(), expected.toJson())
+
+        three = Bin(5, -3.0, 7.0, lambda x: x, value=Sum(lambda x: x))
+        three.fillArray(numpy.array(self.simple), numpy.array([1.0, 2.0] * 5))
+        expected = Bin(5, -3.0, 7.0, lambda x: x, value=Sum(lambda x: x))
+        for x, w in zip(self.simple, [1.0, 2.0] * 5): expected.fill(x, w)
+        self.assertEqual([v.sum for v in three.values], [v.sum for v in expected.values])
+
+        self.checkJson(one)
+
     ################################################################ SparselyBin
 
     def testSparselyBin(self):
@@ -583,6 +694,11 @@ class TestEverything(unittest.TestCase):
 
         self.checkJson(one)
 
+        two = SparselyBin(1.0, lambda x: x, origin=0.5)
+        for _ in self.simple: two.fill(_)
+        self.assertEqual((two + two).origin, 0.5)
+        self.assertEqual((two + two + two).toJson(), (two + two.copy() + two).toJson())
+
     ################################################################ CentrallyBin
 
     def testCentrallyBin(self):
@@ -605,6 +721,23 @@ class TestEverything(unittest.TestCase):
 
         self.checkJson(one)
 
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def testCentrallyBinArrayQueries(self):
+        one = CentrallyBin([-3.0, -1.0, 0.0, 1.0, 3.0, 10.0], lambda x: x)
+        for _ in self.simple: one.fill(_)
+
+        xs = numpy.array([-3.0, -2.0, -1.0, 0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0])
+        ys = numpy.array([-1.0, 0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0, 11.0])
+        self.assertEqual(one.pdfTimesEntries(xs).tolist(), one.pdfTimesEntries(*xs.tolist()))
+        self.assertEqual(one.cdfTimesEntries(xs).tolist(), one.cdfTimesEntries(*xs.tolist()))
+        self.assertEqual(one.qfTimesEntries(ys).tolist(), one.qfTimesEntries(*ys.tolist()))
+        self.assertEqual(one.cdf(xs).tolist(), one.cdf(*xs.tolist()))
+        self.assertEqual(one.qf(0.5), one.qfTimesEntries(5.0))
+
+        one.fill(8.0)
+        self.assertEqual(one.cdfTimesEntries(7.0, 8.0), [9.0 + 2.0 * 0.5/1.5, 11.0])
+        self.assertEqual(one.cdfTimesEntries(numpy.array([7.0, 8.0])).tolist(), [9.0 + 2.0 * 0.5/1.5, 11.0])
+
     ################################################################ AdaptivelyBin
 
     def testAdaptivelyBin(self):
@@ -616,6 +749,41 @@ class TestEverything(unittest.TestCase):
 
         self.checkJson(one)
 
+    def testAdaptivelyBinManyClusters(self):
+        data = [((i * 7919) % 1000) / 10.0 + (i % 3) * 0.01 for i in xrange(3000)] + [50.0, 50.0, -10.0, 200.0] * 20
+        weights = [1.0 + (i % 4) for i in xrange(len(data))]
+        one = AdaptivelyBin(lambda x: x, num=60, value=Sum(lambda x: x))
+        two = AdaptivelyBin(lambda x: x, num=60, value=Sum(lambda x: x))
+        two.clustering._closestPair = two.clustering._scanPairs
+        for x, w in zip(data, weights):
+            one.fill(x, w)
+            two.fill(x, w)
+        self.assertEqual(one.toJson(), two.toJson())
+
+        one += AdaptivelyBin.fromJsonFragment(two.toJsonFragment())
+        for x in data[:200]: one.fill(x)
+        self.assertEqual(len(one.bins), 60)
+        self.checkJson(one)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def testAdaptivelyBinBatch(self):
+        one = AdaptivelyBin(lambda x: x, num=5)
+        one.fillBatch(numpy.array(self.simple + [float("nan")]))
+
+        self.assertEqual(len(one.bins), 5)
+        self.assertEqual(sum(c.entries for x, c in one.bins), 10.0)
+        self.assertEqual(one.nanflow.entries, 1.0)
+        self.assertEqual(one.entries, 11.0)
+        self.assertEqual((one.min, one.max), (-4.7, 7.3))
+
+        two = AdaptivelyBin(lambda x: x, num=100)
+        two.fillBatch(numpy.array(self.simple))
+        three = AdaptivelyBin(lambda x: x, num=100)
+        for _ in self.simple: three.fill(_)
+        self.assertEqual(two.toJson(), three.toJson())
+
+        self.checkJson(one)
+
     ################################################################ Fraction
 
     def testFraction(self):
@@ -821,6 +989,527 @@ class TestEverything(unittest.TestCase):
 
         self.checkJson(branching)
         
+    ################################################################ Batch filling
+
+    def checkBatch(self, makeContainer, data, weights=None):
+        one = makeContainer()
+        if weights is None:
+            for _ in data: one.fill(_)
+        else:
+            for _, w in zip(data, weights): one.fill(_, w)
+        two = makeContainer()
+        two.fillBatch(data, weights)
+        self.assertEqual(one.toJson(), two.toJson())
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def testFillBatch(self):
+        weights = numpy.array([1.0, 2.0, 0.0, -1.0, 3.0, 1.0, 1.0, 2.0, 0.0, 1.0])
+        for data in numpy.array(self.simple), self.simple:
+            for w in None, weights:
+                self.checkBatch(lambda: Count(), data, w)
+                self.checkBatch(lambda: Histogram(5, -3.0, 7.0, lambda x: x), data, w)
+                self.checkBatch(lambda: Fraction(lambda x: x > 0.0, Histogram(5, -3.0, 7.0, lambda x: x)), data, w)
+                self.checkBatch(lambda: Stack(Count(), lambda x: x, 0.0, 2.0, 4.0, 6.0, 8.0), data, w)
+                self.checkBatch(lambda: Partition(Count(), lambda x: x, 0.0, 2.0, 4.0, 6.0, 8.0), data, w)
+                self.checkBatch(lambda: Label(one=Histogram(5, -3.0, 7.0, lambda x: x), two=Histogram(10, 0.0, 10.0, lambda x: x, lambda x: x > 0)), data, w)
+                self.checkBatch(lambda: Index(Histogram(5, -3.0, 7.0, lambda x: x), Histogram(5, -3.0, 7.0, lambda x: 2*x)), data, w)
+                self.checkBatch(lambda: Branch(Histogram(5, -3.0, 7.0, lambda x: x), Count()), data, w)
+                self.checkBatch(lambda: Limit(Count(), 5), data, w)
+                self.checkBatch(lambda: Limit(Count(), 20), data, w)
+                self.checkBatch(lambda: SparselyBin(1.0, lambda x: x), data, w)
+                self.checkBatch(lambda: SparselyBin(2.5, lambda x: x, value=Sum(lambda x: x), origin=0.5), data, w)
+
+        self.checkBatch(lambda: Bin(5, -3.0, 7.0, lambda x: x.double, lambda x: x.bool, Fraction(lambda x: x.int > 0, Count())), self.struct)
+        self.checkBatch(lambda: SparselyBin(1.0, lambda x: x), numpy.array(self.simple + [float("nan")]))
+        self.checkBatch(lambda: SparselyBin(1.0, lambda x: x, value=Sum(lambda x: x)), numpy.array(self.simple + [1e300, -1e300, 2.0**64]))
+        for infinity in float("inf"), float("-inf"):
+            one = SparselyBin(1.0, lambda x: x)
+            self.assertRaises(OverflowError, lambda: [one.fill(_) for _ in self.simple + [infinity]])
+            two = SparselyBin(1.0, lambda x: x)
+            self.assertRaises(OverflowError, lambda: two.fillBatch(numpy.array(self.simple + [infinity])))
+            self.assertEqual(two.toJson(), SparselyBin(1.0, lambda x: x).toJson())
+        self.checkBatch(lambda: SparselyBin(1.0, lambda x: x.double, lambda x: x.int, Sum(lambda x: x.int)), self.struct)
+        self.checkBatch(lambda: Bag(lambda x: x), numpy.array(self.simple * 3), numpy.arange(30) % 4)
+        self.checkBatch(lambda: Bag(lambda x: [x, 2*x]), numpy.array(self.simple * 3), numpy.arange(30) % 4)
+        bagging = Bag(lambda x: x)
+        bagging.fillBatch(numpy.array([[1.0, 2.0], [3.0, 4.0], [1.0, 2.0]]))
+        bagging.fillBatch(numpy.zeros((0, 2)))
+        self.assertEqual(bagging.values, {(1.0, 2.0): 2.0, (3.0, 4.0): 1.0})
+        self.checkBatch(lambda: Bag(lambda x: (x.double, x.int), lambda x: x.bool), self.struct)
+        self.checkBatch(lambda: Bag(lambda x: x.string[0]), self.struct)
+        self.checkBatch(lambda: Bag(lambda x: x), numpy.array([_.string for _ in self.struct] * 2))
+        self.checkBatch(lambda: CentrallyBin([-3.0, -1.0, 0.0, 1.0, 3.0, 10.0], lambda x: x), numpy.array(self.simple + [float("nan"), -0.5, 0.5, 2.0]))
+        self.checkBatch(lambda: CentrallyBin([-3.0, -1.0, 0.0, 1.0, 3.0, 10.0], lambda x: x.double, lambda x: x.int, Sum(lambda x: x.int)), self.struct)
+        self.checkBatch(lambda: Categorize(lambda x: x.string[0]), self.struct)
+        self.checkBatch(lambda: Categorize(lambda x: x.string[0], lambda x: x.int, Sum(lambda x: x.int)), self.struct)
+        self.checkBatch(lambda: Categorize(lambda x: x.int if x.bool else x.string), self.struct)
+        self.checkBatch(lambda: Categorize(lambda x: x), numpy.array([_.string for _ in self.struct] * 3))
+        self.checkBatch(lambda: Categorize(lambda x: len(x)), numpy.array(["a", "bb", "ccc", "dddd"]))
+        self.checkBatch(lambda: Histogram(10, 0.0, 20.0, lambda p: numpy.linalg.norm(p)), numpy.array([[3.0, 4.0], [6.0, 8.0], [1.0, 0.0], [9.0, 12.0]]))
+        self.checkBatch(lambda: Sum(lambda x: x.sum()), numpy.array([[1.0, 2.0], [3.0, 4.0]]))
+        self.checkBatch(lambda: Histogram(5, -3.0, 7.0, vectorize(lambda x: x * 2)), numpy.array(self.simple))
+        self.checkBatch(lambda: Categorize(vectorize(lambda x: len(x))), numpy.array(["a", "bb", "ccc", "dddd"]))
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def testFillBatchColumns(self):
+        columns = Columns({"bool": [_.bool for _ in self.struct], "int": [_.int for _ in self.struct], "double": [_.double for _ in self.struct], "string": [_.string for _ in self.struct]})
+        self.assertEqual(len(columns), 10)
+        self.assertEqual(len(columns[numpy.array([1, 2, 3])]), 3)
+        self.assertEqual(columns[2].double, -1.8)
+
+        self.assertEqual(list(Fcn("double * 2").vectorized(columns)), [_.double * 2 for _ in self.struct])
+        self.assertEqual(list(Fcn("math.sqrt(abs(double))").vectorized(columns)), [math.sqrt(abs(_.double)) for _ in self.struct])
+        self.assertEqual(list(arrayEvaluate(Fcn("int if bool else -int"), columns)), [_.int if _.bool else -_.int for _ in self.struct])
+        self.assertEqual(list(arrayEvaluate(Fcn(lambda x: x.int + 1), columns)), [_.int + 1 for _ in self.struct])
+
+        for makeContainer in [lambda: Histogram(5, -3.0, 7.0, "double", "int"),
+                              lambda: Bin(5, -3.0, 7.0, "double", "bool", Sum("int * 2")),
+                              lambda: Sum("math.floor(double) * 2", "int"),
+                              lambda: Categorize("string[0]", "not bool"),
+                              lambda: Label(a=Sum(lambda x: x.int), b=Sum("double if bool else 0.0")),
+                              lambda: Bag("len(string)"),
+                              lambda: Sum("len(string) + double", "int"),
+                              lambda: Sum("max(int, double)")]:
+            one = makeContainer()
+            for _ in self.struct: one.fill(_)
+            two = makeContainer()
+            two.fillBatch(columns)
+            self.assertEqual(one.toJson(), two.toJson())
+
+        for expression, exception in [("math.sqrt(double)", ValueError), ("math.log(int + 2)", ValueError), ("1.0 / int", ZeroDivisionError)]:
+            one = Sum(expression)
+            self.assertRaises(exception, lambda: [one.fill(_) for _ in self.struct])
+            two = Sum(expression)
+            self.assertRaises(exception, lambda: two.fillBatch(columns))
+        self.checkBatch(lambda: Sum("math.sqrt(double)", "double >= 0.0"), columns)
+
+        self.assertRaises(TypeError, lambda: Fcn("len(string)").vectorized(columns))
+        self.assertRaises(ValueError, lambda: Columns({"x": [1, 2], "y": [1, 2, 3]}))
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def testFillBatchNested(self):
+        makeContainer = lambda: Bin(5, -3.0, 7.0, lambda x: x.double, value=Bin(4, 0.0, 8.0, lambda x: x.int, lambda x: x.bool))
+        self.assertEqual(len(makeContainer()._nestedLevels()), 2)
+        self.checkBatch(makeContainer, self.struct)
+        self.checkBatch(makeContainer, self.struct * 3, numpy.arange(30) % 4 - 1.0)
+
+        makeContainer = lambda: Bin(3, -3.0, 3.0, lambda x: x[0], value=Bin(2, -3.0, 3.0, lambda x: x[1], value=Bin(2, 0.0, 2.0, lambda x: x[2])))
+        data = numpy.array([[x, y, z] for x in self.simple for y in self.simple[:4] + [float("nan")] for z in [0.5, 1.5, 9.0]])
+        self.assertEqual(len(makeContainer()._nestedLevels()), 3)
+        self.checkBatch(makeContainer, data)
+        self.checkBatch(makeContainer, data, numpy.arange(len(data)) % 3)
+
+        self.assertEqual(len(Bin(5, -3.0, 7.0, lambda x: x, value=Bin(4, 0.0, 8.0, lambda x: x, value=Sum(lambda x: x)))._nestedLevels()), 1)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def testFillBatchMoments(self):
+        for i in xrange(11):
+            left, right = numpy.array(self.simple[:i]), numpy.array(self.simple[i:])
+            weights = numpy.array([1.0, 2.0, 0.0, -1.0, 3.0, 1.0, 1.0, 2.0, 0.0, 1.0])
+
+            for makeContainer, fields in [(lambda: Sum(lambda x: x), ["entries", "sum"]),
+                                          (lambda: Average(lambda x: x), ["entries", "mean"]),
+                                          (lambda: Deviate(lambda x: x), ["entries", "mean", "variance"]),
+                                          (lambda: AbsoluteErr(lambda x: x), ["entries", "mae"])]:
+                one = makeContainer()
+                for _, w in zip(self.simple, weights): one.fill(_, w)
+
+                leftBatch = makeContainer()
+                leftBatch.fillBatch(left, weights[:i])
+                rightBatch = makeContainer()
+                rightBatch.fillBatch(right, weights[i:])
+                two = makeContainer()
+                two.fillBatch(left, weights[:i])
+                two.fillBatch(right, weights[i:])
+
+                for field in fields:
+                    self.assertAlmostEqual(getattr(one, field), getattr(two, field))
+                    self.assertAlmostEqual(getattr(one, field), getattr(leftBatch + rightBatch, field))
+
+        for makeContainer in lambda: Minimize(lambda x: x), lambda: Maximize(lambda x: x):
+            for data in [], [float("nan")], [float("nan"), 3.0], self.simple, self.simple + [float("nan")] + self.simple:
+                self.checkBatch(makeContainer, numpy.array(data))
+                self.checkBatch(makeContainer, numpy.array(data), numpy.arange(len(data)) % 3 - 1.0)
+
+            two = makeContainer()
+            two.fillBatch(numpy.array([float("nan")]))
+            two.fillBatch(numpy.array(self.simple))
+            two.fillBatch(numpy.array([float("nan")]))
+            self.assertEqual(two.toJson(), (makeContainer() + two).toJson())
+
+        deviating = Deviate(lambda x: x.double, lambda x: x.int)
+        deviating.fillBatch(self.struct)
+        self.assertAlmostEqual(deviating.variance, self.varianceWeighted(map(lambda _: _.double, self.struct), map(lambda _: _.int, self.struct)))
+        self.checkJson(deviating)
+
+    ################################################################ Fill cache
+
+    def testFillCache(self):
+        calls = []
+        def double(x):
+            calls.append(x)
+            return x.double
+        quantity = Fcn(double)
+
+        label = UntypedLabel(a=Sum(quantity), b=Average(quantity), c=Deviate(quantity))
+        for _ in self.struct: label.fill(_)
+        self.assertEqual(len(calls), len(self.struct))
+        self.assertEqual(label("a").sum, sum(_.double for _ in self.struct))
+
+        del calls[:]
+        branch = Branch(Sum(quantity), Index(Minimize(quantity), Minimize(quantity)), Maximize(quantity))
+        for _ in self.struct: branch.fill(_)
+        self.assertEqual(len(calls), len(self.struct))
+
+        del calls[:]
+        quantity(self.struct[0])
+        quantity(self.struct[0])
+        self.assertEqual(len(calls), 2)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def testFillCacheBatch(self):
+        calls = []
+        def square(x):
+            calls.append(x)
+            return x**2
+        quantity = Fcn(square)
+
+        one = UntypedLabel(a=Sum(quantity), b=Maximize(quantity), c=Bin(5, 0.0, 100.0, quantity))
+        data = numpy.floor(numpy.array(self.simple) * 10)
+        for _ in data: one.fill(_)
+        two = one.zero()
+        del calls[:]
+        two.fillBatch(data)
+        self.assertEqual(len(calls), len(data))
+        self.assertEqual(one.toJson(), two.toJson())
+
+        quantity = vectorize(square)
+        three = UntypedLabel(a=Sum(quantity), b=Maximize(quantity), c=Bin(5, 0.0, 100.0, quantity))
+        del calls[:]
+        three.fillBatch(data)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(three.toJson(), one.toJson())
+
+    ################################################################ Binary serialization
+
+    def testBytes(self):
+        obj = {"a": [1.5, float("nan"), float("-inf")], "b": [1, 2**70, -3, True, None, u"\u03bb"], "a ": {"a": "a"}, "c": []}
+        out = decodeBytes(encodeBytes(obj))
+        self.assertEqual(set(out.keys()), set(obj.keys()))
+        self.assertTrue(math.isnan(out["a"][1]))
+        self.assertEqual(out["a"][2], float("-inf"))
+        self.assertEqual(out["b"], obj["b"])
+        self.assertEqual(out["a "], obj["a "])
+        self.assertEqual(out["c"], [])
+
+        histogram = Histogram(10000, 0.0, 1.0, lambda x: x)
+        for _ in self.simple: histogram.fill(_ / 10.0)
+        self.assertEqual(Factory.fromBytes(histogram.toBytes()).toJson(), histogram.toJson())
+        self.assertLess(len(histogram.toBytes()), 8 * 10000 + 500)
+        for i in xrange(10000): histogram.fill(i / 10000.0, 1.0 / 7.0)
+        self.assertLess(len(histogram.toBytes()), len(json.dumps(histogram.toJson())) / 2)
+
+        self.assertEqual(decodeBytes(encodeBytes([{"x": 1.5, "y": "a"}, {"x": 2.5, "y": None}])), [{"x": 1.5, "y": "a"}, {"x": 2.5, "y": None}])
+        central = CentrallyBin([float(i) for i in xrange(1000)], lambda x: x)
+        moments = Bin(1000, 0.0, 1000.0, lambda x: x, value=Deviate(lambda x: x))
+        for i in xrange(3000):
+            central.fill(i / 3.0 + 0.1, 1.0 / 7.0)
+            moments.fill(i / 3.0 + 0.1, 1.0 / 7.0)
+        for container in central, moments:
+            self.assertEqual(Factory.fromBytes(container.toBytes()).toJson(), container.toJson())
+            self.assertLess(len(container.toBytes()), len(json.dumps(container.toJson())) / 2)
+        self.assertLess(len(central.toBytes()), 2 * 8 * 1000 + 500)
+        self.assertLess(len(moments.toBytes()), 3 * 8 * 1000 + 500)
+
+        data = Label(a=Sum(lambda x: x), b=Sum(lambda x: x)).toBytes()
+        self.assertRaises(ValueError, lambda: Factory.fromBytes(data[:-1]))
+        self.assertRaises(ValueError, lambda: Factory.fromBytes(data + "N"))
+        self.assertRaises(ValueError, lambda: Factory.fromBytes("{}"))
+
+    def testJsonDecoder(self):
+        double = lambda x: x.double
+        containers = [Count(),
+                      Sum(double),
+                      Deviate(double),
+                      Minimize(double),
+                      Histogram(5, -3.0, 7.0, double),
+                      Bin(5, -3.0, 7.0, double, value=Average(double)),
+                      Bin(3, -3.0, 7.0, double, value=Bin(2, 0.0, 10.0, lambda x: x.int, value=Maximize(double))),
+                      SparselyBin(2.0, double, value=Label(a=Sum(double), b=Sum(lambda x: x.int))),
+                      Categorize(lambda x: x.string[0], value=Fraction(lambda x: x.bool, Histogram(3, -3.0, 7.0, double))),
+                      Index(Count(), Count()),
+                      Branch(Stack(Count(), double, 0.0, 2.0), UntypedLabel(x=Count(), y=Sum(double)), Bag(double))]
+        for x in containers:
+            for _ in self.struct: x.fill(_)
+
+        for validate in True, False:
+            decoder = histogrammar.decoder.JsonDecoder(validate)
+            for i in xrange(2):
+                for x in containers + [x.zero() for x in containers[:-1]]:
+                    expected = Factory.fromJson(x.toJson())
+                    out = decoder.fromJson(x.toJson())
+                    self.assertEqual(out.__class__, expected.__class__)
+                    self.assertEqual(out.toJson(), expected.toJson())
+                    self.assertEqual(decoder.fromJson(json.dumps(x.toJson())).toJson(), expected.toJson())
+
+        decoder = histogrammar.decoder.JsonDecoder()
+        decoder.fromJson(containers[4].toJson())
+        bad = containers[4].toJson()
+        bad["data"]["values"][2] = -1.0
+        self.assertRaises(ContainerException, lambda: decoder.fromJson(bad))
+        bad["data"]["values"][2] = "one"
+        self.assertRaises(JsonFormatException, lambda: decoder.fromJson(bad))
+        self.assertRaises(JsonFormatException, lambda: decoder.fromJson({"type": "Nothing", "data": 1.0}))
+
+    def testJsonStream(self):
+        double = lambda x: x.double
+        for x in [Histogram(5, -3.0, 7.0, double),
+                  SparselyBin(1.0, double, value=Bag(lambda x: x.string)),
+                  Categorize(lambda x: x.string, value=Fraction(lambda x: x.bool, Deviate(double))),
+                  Label(a=Bag(lambda x: (x.double, x.int)), b=Bag(lambda x: (x.int, x.double))),
+                  Index(Minimize(double), Minimize(lambda x: x.int)),
+                  Branch(Partition(Sum(double), double, 0.0), Limit(Count(), 5.0), Limit(Count(), 100.0), CentrallyBin([-3.0, 0.0, 5.0], double))]:
+            for _ in self.struct: x.fill(_)
+            stream = StringIO.StringIO()
+            x.toJsonStream(stream)
+            self.assertEqual(Factory.fromJson(x.toJson()).toJson(), Factory.fromJson(stream.getvalue()).toJson())
+
+        for key in [lambda x: x.int, lambda x: x.double, lambda x: x.bool, lambda x: None if x.bool else x.int * 2**70]:
+            x = Categorize(key)
+            for _ in self.struct: x.fill(_)
+            stream = StringIO.StringIO()
+            x.toJsonStream(stream)
+            self.assertEqual(json.loads(stream.getvalue()), json.loads(json.dumps(x.toJson())))
+
+    def testLazyJson(self):
+        double = lambda x: x.double
+        for x in [Label(a=Histogram(5, -3.0, 7.0, double), b=Histogram(5, -3.0, 7.0, lambda x: x.int)),
+                  UntypedLabel(a=Sum(double), b=Index(Count(), Count())),
+                  Branch(Categorize(lambda x: x.string[0], value=Label(x=Sum(double))), Count()),
+                  Count()]:
+            for _ in self.struct: x.fill(_)
+            self.assertEqual(Factory.fromJson(x.toJson(), lazy=True), Factory.fromJson(x.toJson()))
+            self.assertEqual(Factory.fromJson(json.dumps(x.toJson()), lazy=True).toJson(), x.toJson())
+
+        x = Factory.fromJson(Label(a=Histogram(5, -3.0, 7.0, double), b=Histogram(5, -3.0, 7.0, double)).toJson(), lazy=True)
+        self.assertTrue(isinstance(x("a"), Bin))
+        self.assertEqual(x("a").name, "Bin")
+        self.assertTrue(isinstance(x("a"), LazyContainer))
+        self.assertEqual(x("a").num, 5)
+        self.assertFalse(isinstance(x("a"), LazyContainer))
+        self.assertTrue(isinstance(x("b"), LazyContainer))
+
+        bad = Index(Count(), Count()).toJson()
+        bad["data"]["data"][1] = "one"
+        x = Factory.fromJson(bad, lazy=True)
+        self.assertEqual(x(0).entries, 0.0)
+        self.assertRaises(JsonFormatException, lambda: x(1).entries)
+        self.assertRaises(JsonFormatException, lambda: Factory.fromJson(bad))
+
+    ################################################################ Compiled fill kernels
+
+    def testCompileFill(self):
+        weights = [1.0, 2.0, 0.0, -1.0, 3.0, 1.0, 1.0, 2.0, 0.0, 1.0]
+        data = self.struct + [self.Struct(True, 1, float("nan"), "n")]
+        double = lambda x: x.double
+        for makeContainer in [lambda: Count(),
+                              lambda: Sum(double, lambda x: x.int),
+                              lambda: Average(double),
+                              lambda: Deviate(double, lambda x: x.bool),
+                              lambda: Label(lo=Minimize(double), hi=Minimize(lambda x: -x.double)),
+                              lambda: Index(Maximize(double), Maximize(lambda x: x.int)),
+                              lambda: Histogram(5, -3.0, 7.0, double),
+                              lambda: Bin(5, -3.0, 7.0, double, lambda x: x.int, Bin(2, 0.0, 10.0, lambda x: x.int, value=Deviate(double))),
+                              lambda: SparselyBin(2.0, double, value=Label(a=Sum(double), b=Sum(lambda x: x.int))),
+                              lambda: Categorize(lambda x: x.string[0], value=Fraction(lambda x: x.bool, Average(double))),
+                              lambda: Branch(Stack(Count(), double, 0.0, 2.0), Partition(Sum(double), double, 0.0, 2.0), Bag(double), UntypedLabel(x=Count(), y=Sum(double)))]:
+            for w in None, weights:
+                one = makeContainer()
+                two = makeContainer()
+                fill = histogrammar.kernel.compileFill(two)
+                if w is None:
+                    for _ in data:
+                        one.fill(_)
+                        fill(_)
+                else:
+                    for _, x in zip(data, w):
+                        one.fill(_, x)
+                        fill(_, x)
+                self.assertEqual(one.toJson(), two.toJson())
+
+        calls = []
+        def shared(x):
+            calls.append(x)
+            return x.double
+        quantity = Fcn(shared)
+        fill = histogrammar.kernel.compileFill(Label(a=Sum(quantity), b=Sum(quantity, lambda x: x.bool)))
+        for _ in self.struct: fill(_)
+        self.assertEqual(len(calls), len(self.struct))
+
+        self.assertRaises(ContainerException, lambda: histogrammar.kernel.compileFill(Factory.fromJson(Sum(double).toJson())))
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def testNumbaJit(self):
+        try:
+            import numba
+        except ImportError:
+            numba = None
+        try:
+            self.assertEqual(histogrammar.util.numbaJit.enable(), numba is not None)
+            data = numpy.floor(numpy.array(self.simple) * 10)
+            weights = numpy.array([1.0, 2.0, 0.0, -1.0, 3.0, 1.0, 1.0, 2.0, 0.0, 1.0])
+            branchy = lambda x: x if x > 0 else -2 * x
+            for makeContainer in [lambda: Histogram(5, -30.0, 50.0, branchy),
+                                  lambda: Bin(5, -30.0, 50.0, lambda x: float("nan") if x == 0 else x),
+                                  lambda: Sum(branchy, lambda x: x < 20),
+                                  lambda: Minimize(branchy),
+                                  lambda: Categorize(lambda x: "pos" if x > 0 else "neg")]:
+                self.checkBatch(makeContainer, data)
+                self.checkBatch(makeContainer, data, weights)
+        finally:
+            histogrammar.util.numbaJit.enable(False)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def testNumbaJitCompiled(self):
+        try:
+            import numba
+        except ImportError:
+            raise unittest.SkipTest("Numba is not installed")
+
+        data = numpy.floor(numpy.array(self.simple * 100) * 10) + numpy.arange(1000) % 7
+        weights = (numpy.arange(1000) % 5) * 0.5 - 0.5
+        quantity = Fcn(lambda x: x if x > 0 else -2 * x)
+        for makeContainer in [lambda: Histogram(20, -30.0, 50.0, quantity),
+                              lambda: Bin(20, -30.0, 50.0, lambda x: float("nan") if x == 3 else x),
+                              lambda: Bin(20, -30.0, 50.0, quantity, lambda x: x < 20, value=Sum(quantity)),
+                              lambda: Sum(quantity, lambda x: x < 20),
+                              lambda: Maximize(quantity)]:
+            for w in None, weights:
+                plain = makeContainer()
+                plain.fillBatch(data, w)
+                try:
+                    self.assertTrue(histogrammar.util.numbaJit.enable())
+                    jitted = makeContainer()
+                    jitted.fillBatch(data, w)
+                finally:
+                    histogrammar.util.numbaJit.enable(False)
+                self.assertEqual(jitted.toJson(), plain.toJson())
+
+        self.assertIsNotNone(quantity._jitted[data.dtype])
+        self.assertIsNotNone(histogrammar.util.numbaJit._histogram)
+
+    ################################################################ In-place merge
+
+    def testInPlaceMerge(self):
+        makers = [lambda: Count(),
+                  lambda: Sum(lambda x: x),
+                  lambda: Average(lambda x: x),
+                  lambda: Deviate(lambda x: x),
+                  lambda: AbsoluteErr(lambda x: x),
+                  lambda: Minimize(lambda x: x),
+                  lambda: Maximize(lambda x: x),
+                  lambda: Quantile(0.5, lambda x: x),
+                  lambda: Bag(lambda x: x),
+                  lambda: Histogram(5, -3.0, 7.0, lambda x: x),
+                  lambda: Bin(5, -3.0, 7.0, lambda x: x, value=Sum(lambda x: x)),
+                  lambda: Bin(5, -3.0, 7.0, lambda x: x, value=Deviate(lambda x: x)),
+                  lambda: Bin(2, -3.0, 7.0, lambda x: x, value=Bin(3, -5.0, 5.0, lambda x: -x)),
+                  lambda: SparselyBin(1.0, lambda x: x),
+                  lambda: SparselyBin(1.0, lambda x: x, origin=0.5),
+                  lambda: CentrallyBin([-3.0, -1.0, 0.0, 1.0, 3.0, 10.0], lambda x: x),
+                  lambda: AdaptivelyBin(lambda x: x, num=5),
+                  lambda: AdaptivelyBin(lambda x: x, num=5, value=Sum(lambda x: x)),
+                  lambda: Fraction(lambda x: x > 0.0, Sum(lambda x: x)),
+                  lambda: Stack(Count(), lambda x: x, 0.0, 2.0, 4.0),
+                  lambda: Partition(Count(), lambda x: x, 0.0, 2.0, 4.0),
+                  lambda: Categorize(lambda x: "positive" if x > 0.0 else "not"),
+                  lambda: Label(one=Count(), two=Count()),
+                  lambda: UntypedLabel(one=Count(), two=Sum(lambda x: x)),
+                  lambda: Index(Count(), Count()),
+                  lambda: Branch(Count(), Sum(lambda x: x))]
+
+        for makeContainer in makers:
+            for i in xrange(11):
+                left, right = self.simple[:i], self.simple[i:]
+
+                leftResult = makeContainer()
+                rightResult = makeContainer()
+                for _ in left: leftResult.fill(_)
+                for _ in right: rightResult.fill(_)
+
+                expected = (leftResult + rightResult).toJson()
+                unchanged = rightResult.toJson()
+
+                finalResult = leftResult
+                finalResult += rightResult
+
+                self.assertIs(finalResult, leftResult)
+                self.assertEqual(finalResult.toJson(), expected)
+                self.assertEqual(rightResult.toJson(), unchanged)
+
+        adaptive = AdaptivelyBin(lambda x: x, num=5)
+        clustering = adaptive.clustering
+        adaptive += AdaptivelyBin(lambda x: x, num=5)
+        self.assertIs(adaptive.clustering, clustering)
+
+        def iadd(one, two):
+            one += two
+        self.assertRaises(ContainerException, lambda: iadd(Limit(Count(), 5), Limit(Count(), 6)))
+        self.assertRaises(ContainerException, lambda: Limit(Count(), 5) + Limit(Count(), 6))
+        self.assertRaises(ContainerException, lambda: iadd(CentrallyBin([1.0, 2.0], lambda x: x), Count()))
+        self.assertRaises(ContainerException, lambda: CentrallyBin([1.0, 2.0], lambda x: x) + Count())
+        self.assertRaises(ContainerException, lambda: iadd(AdaptivelyBin(lambda x: x), Count()))
+        self.assertRaises(ContainerException, lambda: AdaptivelyBin(lambda x: x) + Count())
+
+    ################################################################ Parallel filling
+
+    def testReduceTree(self):
+        partials = []
+        for x in self.simple:
+            counting = Count()
+            counting.fill(x)
+            partials.append(counting)
+        for i in xrange(len(partials) + 1):
+            result = histogrammar.parallel.reduceTree(partials[:i])
+            if i == 0:
+                self.assertIsNone(result)
+            else:
+                self.assertEqual(result.entries, float(i))
+
+    def testParallelFill(self):
+        data = [(_.bool, _.int, _.double, _.string) for _ in self.struct] * 5   # picklable, unlike Struct
+        for makeContainer in [lambda: Histogram(5, -3.0, 7.0, lambda x: x[2]),
+                              lambda: Bin(5, -3.0, 7.0, lambda x: x[2], lambda x: x[0], Deviate(lambda x: x[1])),
+                              lambda: UntypedLabel(a=Sum(lambda x: x[1]), b=Categorize(lambda x: x[3][0])),
+                              lambda: SparselyBin(1.0, lambda x: x[2], origin=0.5)]:
+            one = makeContainer()
+            for _ in data: one.fill(_)
+
+            two = makeContainer()
+            result = histogrammar.parallel.fill(two, data, processes=2, chunksize=7)
+            self.assertIs(result, two)
+            self.assertEqual(Factory.fromJson(one.toJson()).toJson(), Factory.fromJson(two.toJson()).toJson())
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def testThreadedFillBatch(self):
+        data = numpy.floor(self.simple * 10)   # integer-valued so that sums do not depend on the order of merging
+        weights = numpy.arange(len(data)) % 3
+        for makeContainer in [lambda: Histogram(5, -3.0, 7.0, lambda x: x),
+                              lambda: Bin(5, -3.0, 7.0, lambda x: x, value=Sum(lambda x: x)),
+                              lambda: Categorize(lambda x: "positive" if x > 0.0 else "not"),
+                              lambda: SparselyBin(1.0, lambda x: x, origin=0.5)]:
+            for w in None, weights, 2.0:
+                one = makeContainer()
+                one.fillBatch(data, w)
+
+                two = makeContainer()
+                result = histogrammar.parallel.fillBatch(two, data, w, threads=3, chunksize=7)
+                self.assertIs(result, two)
+                self.assertEqual(Factory.fromJson(one.toJson()).toJson(), Factory.fromJson(two.toJson()).toJson())
+
+        failing = Sum(lambda x: x.nonexistent)
+        self.assertRaises(AttributeError, lambda: histogrammar.parallel.fillBatch(failing, data, threads=2, chunksize=7))
+
     ################################################################ Usability in fold/aggregate
 
     # def testAggregate(self):